@@ -0,0 +1,55 @@
+import typing
+
+import auth.functions as auth_functions
+import fastapi
+from finances import rates, slow_queries
+from helpers import database, pool
+
+router = fastapi.APIRouter(
+    prefix="/admin",
+    dependencies=[fastapi.Depends(auth_functions.require_admin)],
+)
+
+
+@router.get(
+    "/indexes/",
+    response_description="Report missing, unused and unregistered indexes",
+    response_model=typing.Dict[str, typing.Dict[str, typing.List[str]]],
+    status_code=200,
+)
+async def get_index_report() -> typing.Dict[str, typing.Dict[str, typing.List[str]]]:
+    return await database.get_index_report()
+
+
+@router.post(
+    "/currency-rates/invalidate/",
+    response_description="Trigger a refresh of the in-process currency rates cache",
+    response_model=str,
+    status_code=200,
+)
+async def invalidate_currency_rates() -> str:
+    rates.currency_rates.invalidate()
+
+    return "Currency rates cache invalidated"
+
+
+@router.get(
+    "/database-pool/",
+    response_description="Get connection pool checkout statistics",
+    response_model=typing.Dict[str, typing.Any],
+    status_code=200,
+)
+async def get_database_pool_stats() -> typing.Dict[str, typing.Any]:
+    return pool.pool_stats.stats()
+
+
+@router.get(
+    "/slow-queries/",
+    response_description="List the worst slow query shapes",
+    response_model=typing.List[typing.Dict[str, typing.Any]],
+    status_code=200,
+)
+async def get_slow_queries(
+    limit: int = fastapi.Query(default=20, ge=1, le=100),
+) -> typing.List[typing.Dict[str, typing.Any]]:
+    return await slow_queries.list_worst(limit)
@@ -1,3 +1,5 @@
+import asyncio
+import concurrent.futures
 import datetime
 import os
 import typing
@@ -5,13 +7,16 @@ import typing
 import bson
 import dotenv
 import fastapi
+import pymongo.errors
 from fastapi.security import OAuth2PasswordBearer
-from helpers import database
+from helpers import cache, database, metrics
 from jose import JWTError, jwt
 from passlib.context import CryptContext
 
 from . import models
 
+T = typing.TypeVar("T")
+
 env_path = dotenv.find_dotenv(filename=".env", raise_error_if_not_found=True)
 if not env_path:
     env_path = dotenv.find_dotenv(
@@ -28,7 +33,30 @@ ALGORITHM = "HS256"
 ACCESS_TOKEN_EXPIRE_HOURS = 24
 REFRESH_TOKEN_EXPIRE_HOURS = 24 * 7
 
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+BCRYPT_ROUNDS = int(os.getenv("BCRYPT_ROUNDS", "12"))
+PASSWORD_HASH_WORKERS = int(os.getenv("PASSWORD_HASH_WORKERS", "2"))
+PASSWORD_HASH_QUEUE_LIMIT = int(os.getenv("PASSWORD_HASH_QUEUE_LIMIT", "32"))
+
+pwd_context = CryptContext(
+    schemes=["bcrypt"],
+    deprecated="auto",
+    bcrypt__default_rounds=BCRYPT_ROUNDS,
+    bcrypt__min_rounds=BCRYPT_ROUNDS,
+    bcrypt__max_rounds=BCRYPT_ROUNDS,
+)
+
+password_executor = concurrent.futures.ThreadPoolExecutor(
+    max_workers=PASSWORD_HASH_WORKERS, thread_name_prefix="password-hash"
+)
+pending_password_jobs = 0
+
+USER_CACHE_SIZE = int(os.getenv("USER_CACHE_SIZE", "1024"))
+USER_CACHE_TTL_SECONDS = float(os.getenv("USER_CACHE_TTL_SECONDS", "60"))
+
+user_cache: cache.TTLCache[models.User] = cache.TTLCache(
+    maxsize=USER_CACHE_SIZE, ttl=USER_CACHE_TTL_SECONDS
+)
+metrics.register_cache("user", user_cache)
 
 
 def verify_password(plain_password, hashed_password):
@@ -39,6 +67,36 @@ def get_password_hash(password):
     return pwd_context.hash(password)
 
 
+async def _run_password_job(func: typing.Callable[..., T], *args: typing.Any) -> T:
+    global pending_password_jobs
+
+    if pending_password_jobs >= PASSWORD_HASH_QUEUE_LIMIT:
+        raise fastapi.HTTPException(
+            status_code=503,
+            detail="Too many password operations, try again later",
+            headers={"Retry-After": "1"},
+        )
+
+    pending_password_jobs += 1
+    try:
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(password_executor, func, *args)
+    finally:
+        pending_password_jobs -= 1
+
+
+async def hash_password(password: str) -> str:
+    return await _run_password_job(get_password_hash, password)
+
+
+async def verify_and_update_password(
+    plain_password: str, hashed_password: str
+) -> typing.Tuple[bool, typing.Optional[str]]:
+    return await _run_password_job(
+        pwd_context.verify_and_update, plain_password, hashed_password
+    )
+
+
 # CREATE TOKENS
 
 
@@ -98,16 +156,10 @@ def refresh_access_token(refresh_token: str) -> typing.Optional[str]:
     if REFRESH_SECRET_KEY is None or ACCESS_SECRET_KEY is None:
         return None
 
-    if not verify_refresh_token(refresh_token):
+    if (payload := decode_verified_token(refresh_token, "refresh")) is None:
         return None
 
-    payload = jwt.decode(refresh_token, REFRESH_SECRET_KEY, algorithms=[ALGORITHM])
-    user_id = payload.get("sub")
-
-    if user_id is None:
-        return None
-
-    return generate_access_token(user_id=user_id)
+    return generate_access_token(user_id=payload["sub"])
 
 
 # DECODE TOKENS
@@ -130,27 +182,35 @@ def decode_token(
 # VERIFY TOKENS
 
 
-def verify_token(token: str, token_type: typing.Literal["access", "refresh"]) -> bool:
+def decode_verified_token(
+    token: str, token_type: typing.Literal["access", "refresh"]
+) -> typing.Optional[typing.Dict[str, typing.Any]]:
     secret_key = ACCESS_SECRET_KEY if token_type == "access" else REFRESH_SECRET_KEY
 
     if secret_key is None:
-        return False
+        return None
 
     try:
         payload = jwt.decode(token, secret_key, algorithms=ALGORITHM)
+    except JWTError:
+        return None
 
-        exp = payload.get("exp")
-        current_time = int(datetime.datetime.now().timestamp())
+    exp = payload.get("exp")
+    current_time = int(datetime.datetime.now().timestamp())
 
-        return (
-            payload.get("token_type") == token_type
-            and payload.get("sub") is not None
-            and exp is not None
-            and exp > current_time
-        )
+    if (
+        payload.get("token_type") != token_type
+        or payload.get("sub") is None
+        or exp is None
+        or exp <= current_time
+    ):
+        return None
+
+    return payload
 
-    except JWTError as e:
-        return False
+
+def verify_token(token: str, token_type: typing.Literal["access", "refresh"]) -> bool:
+    return decode_verified_token(token, token_type) is not None
 
 
 def verify_access_token(token: str) -> bool:
@@ -218,28 +278,57 @@ async def find_user(
 async def create_user(username: str, password: str) -> models.User:
     collection = database.get_collection("users")
 
-    user = models.User(username=username, password=get_password_hash(password))
+    user = models.User(username=username, password=await hash_password(password))
 
-    result = await collection.insert_one(user.model_dump())
+    try:
+        result = await collection.insert_one(user.model_dump())
+    except pymongo.errors.DuplicateKeyError:
+        raise fastapi.HTTPException(status_code=400, detail="Username already taken")
 
     user.id = result.inserted_id
 
     return user
 
 
+async def update_password_hash(user: models.User, hashed_password: str):
+    collection = database.get_collection("users")
+
+    await collection.update_one(
+        {"_id": bson.ObjectId(user.id)},
+        {"$set": {"password": hashed_password}},
+    )
+
+    user.password = hashed_password
+    user_cache.invalidate(str(user.id))
+
+
 async def get_current_user(
     token: str = fastapi.Depends(OAuth2PasswordBearer(tokenUrl="/auth/token")),
 ) -> models.User:
-    if not verify_access_token(token):
+    if (payload := decode_verified_token(token, "access")) is None:
         raise fastapi.HTTPException(status_code=401, detail="Invalid token")
 
-    payload = decode_token(token, "access")
-    user_id = str(payload.get("sub"))
+    user_id = str(payload["sub"])
 
-    if (user := await find_user(user_id=user_id)) is None:
-        raise fastapi.HTTPException(status_code=401, detail="User not found")
+    if (user := user_cache.get(user_id)) is None:
+        if (user := await find_user(user_id=user_id)) is None:
+            raise fastapi.HTTPException(status_code=401, detail="User not found")
 
-    return user
+        user_cache.set(user_id, user)
+
+    return user.model_copy()
+
+
+async def require_admin(
+    current_user: models.User = fastapi.Depends(get_current_user),
+) -> models.User:
+    if current_user.id is None:
+        raise fastapi.HTTPException(status_code=401, detail="User not authenticated")
+
+    if not current_user.is_admin:
+        raise fastapi.HTTPException(status_code=403, detail="Admin access required")
+
+    return current_user
 
 
 async def update_user(current_user: models.User, request_data: models.UserRequest):
@@ -251,14 +340,19 @@ async def update_user(current_user: models.User, request_data: models.UserReques
     if request_data.currency is not None:
         current_user.currency = request_data.currency
 
-    await collection.update_one(
-        {"_id": bson.ObjectId(current_user.id)},
-        {
-            "$set": {
-                "username": current_user.username,
-                "currency": current_user.currency,
-            }
-        },
-    )
+    try:
+        await collection.update_one(
+            {"_id": bson.ObjectId(current_user.id)},
+            {
+                "$set": {
+                    "username": current_user.username,
+                    "currency": current_user.currency,
+                }
+            },
+        )
+    except pymongo.errors.DuplicateKeyError:
+        raise fastapi.HTTPException(status_code=400, detail="Username already taken")
+
+    user_cache.invalidate(str(current_user.id))
 
     return current_user
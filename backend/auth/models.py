@@ -29,6 +29,7 @@ class User(pydantic.BaseModel):
     username: str
     password: str
     currency: str = "USD"
+    is_admin: bool = False
 
     model_config = pydantic.ConfigDict(
         arbitrary_types_allowed=True,
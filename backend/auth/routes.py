@@ -23,9 +23,16 @@ async def login(
     if (user := await functions.find_user(username=username)) is None:
         raise fastapi.HTTPException(status_code=400, detail="Invalid username")
 
-    if not functions.verify_password(password, user.password):
+    is_verified, new_password_hash = await functions.verify_and_update_password(
+        password, user.password
+    )
+
+    if not is_verified:
         raise fastapi.HTTPException(status_code=401, detail="Invalid password")
 
+    if new_password_hash is not None:
+        await functions.update_password_hash(user, new_password_hash)
+
     token_pair = functions.generate_tokens(user=user)
 
     if token_pair is None:
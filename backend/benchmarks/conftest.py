@@ -0,0 +1,10 @@
+import pytest
+
+
+@pytest.hookimpl(trylast=True)
+def pytest_configure(config):
+    session = getattr(config, "_benchmarksession", None)
+
+    if session is not None and session.compare_fail and not session.compared_mapping:
+        session.logger.warning("No stored baseline found, recording this run only")
+        session.compare_fail = []
@@ -0,0 +1,272 @@
+import argparse
+import asyncio
+import datetime
+import json
+import pathlib
+import platform
+import statistics
+import subprocess
+import time
+import typing
+
+import auth.models as auth_models
+import calendarSummary.routes as calendar_routes
+import helpers.database as database
+from benchmarks import dataset
+from finances import functions, models, rates
+
+DEFAULT_SCALES = [1_000, 10_000, 100_000, 1_000_000]
+RESULTS_DIR = pathlib.Path(__file__).parent / "results"
+WINDOW_DAYS = 365
+
+Operation = typing.Callable[[], typing.Awaitable[int]]
+
+
+async def measure(
+    operation: Operation, repeats: int, warmup: int
+) -> typing.Dict[str, float]:
+    for _ in range(warmup):
+        await operation()
+
+    timings = []
+    for _ in range(repeats):
+        started = time.perf_counter()
+        results = await operation()
+        timings.append((time.perf_counter() - started) * 1000)
+
+    timings.sort()
+
+    return {
+        "results": results,
+        "min_ms": round(timings[0], 3),
+        "median_ms": round(statistics.median(timings), 3),
+        "p95_ms": round(timings[min(len(timings) - 1, int(len(timings) * 0.95))], 3),
+        "max_ms": round(timings[-1], 3),
+    }
+
+
+def get_operations(
+    user: dataset.SyntheticUser, subscription_id: typing.Optional[str]
+) -> typing.Dict[str, Operation]:
+    wrapper = models.FinanceItemWrapper(user.timezone)
+    end_date = dataset.START_DATE + datetime.timedelta(days=dataset.SPAN_DAYS)
+    start_date = end_date - datetime.timedelta(days=WINDOW_DAYS)
+    start, end = start_date.date().isoformat(), end_date.date().isoformat()
+    current_user = auth_models.User(
+        _id=user.id, username=user.username, password="", currency=user.currency
+    )
+
+    async def list_items() -> int:
+        return sum([1 async for _ in wrapper.list_items(start, end, user.id)])
+
+    async def list_subscription_items() -> int:
+        return sum(
+            [1 async for _ in wrapper.list_subscription_items(start, end, user.id)]
+        )
+
+    async def get_finance_items_from_subscription() -> int:
+        return len(await wrapper.get_finance_items_from_subscription(subscription_id))
+
+    async def calendar_summary() -> int:
+        response = await calendar_routes.get_calendar_summary(
+            startDate=start,
+            endDate=end,
+            convertTo=user.currency,
+            current_user=current_user,
+            finance_wrapper=wrapper,
+        )
+        return len(json.loads(response.body))
+
+    async def load_currency_rates() -> int:
+        await rates.currency_rates.load()
+        return len(rates.currency_rates.currencies)
+
+    async def get_currency_rates() -> int:
+        return len(functions.get_currency_rates())
+
+    operations: typing.Dict[str, Operation] = {
+        "list_items": list_items,
+        "list_subscription_items": list_subscription_items,
+        "calendar_summary": calendar_summary,
+        "load_currency_rates": load_currency_rates,
+        "get_currency_rates": get_currency_rates,
+    }
+
+    if subscription_id is not None:
+        operations["get_finance_items_from_subscription"] = (
+            get_finance_items_from_subscription
+        )
+
+    return operations
+
+
+async def pick_subscription(user: dataset.SyntheticUser) -> typing.Optional[str]:
+    doc = await database.get_collection("subscriptions").find_one(
+        {"user": user.id, "repeat_period": "day", "end_date": None}, {"_id": 1}
+    ) or await database.get_collection("subscriptions").find_one(
+        {"user": user.id}, {"_id": 1}
+    )
+
+    return str(doc["_id"]) if doc is not None else None
+
+
+async def run_scale(
+    database_name: str,
+    items: int,
+    seed: int,
+    repeats: int,
+    warmup: int,
+) -> typing.Dict[str, typing.Any]:
+    await dataset.reset(database_name)
+
+    started = time.perf_counter()
+    users = await dataset.generate(items, seed=seed)
+    generation_s = time.perf_counter() - started
+
+    await rates.currency_rates.load()
+
+    by_size = sorted(users, key=lambda user: user.items)
+    profiles = {"largest_user": by_size[-1], "median_user": by_size[len(by_size) // 2]}
+
+    results: typing.Dict[str, typing.Any] = {
+        "items": items,
+        "users": len(users),
+        "generation_s": round(generation_s, 2),
+        "profiles": {},
+    }
+
+    for profile, user in profiles.items():
+        operations = get_operations(user, await pick_subscription(user))
+
+        results["profiles"][profile] = {
+            "user_items": user.items,
+            "user_subscriptions": user.subscriptions,
+            "timezone": user.timezone,
+            "operations": {
+                name: await measure(operation, repeats, warmup)
+                for name, operation in operations.items()
+            },
+        }
+
+    return results
+
+
+def get_git_commit() -> typing.Optional[str]:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "HEAD"],
+            capture_output=True,
+            check=True,
+            text=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(
+    current: typing.Dict[str, typing.Any], previous: typing.Dict[str, typing.Any]
+) -> typing.List[str]:
+    previous_scales = {scale["items"]: scale for scale in previous["scales"]}
+    lines = []
+
+    for scale in current["scales"]:
+        if (previous_scale := previous_scales.get(scale["items"])) is None:
+            continue
+
+        for profile, profile_results in scale["profiles"].items():
+            previous_operations = (
+                previous_scale["profiles"].get(profile, {}).get("operations", {})
+            )
+
+            for name, result in profile_results["operations"].items():
+                if (previous_result := previous_operations.get(name)) is None:
+                    continue
+
+                ratio = result["median_ms"] / max(previous_result["median_ms"], 1e-9)
+                lines.append(
+                    f"{scale['items']:>9} {profile:<13} {name:<36} "
+                    f"{previous_result['median_ms']:10.3f} -> "
+                    f"{result['median_ms']:10.3f} ms ({ratio:5.2f}x)"
+                )
+
+    return lines
+
+
+async def main(
+    scales: typing.List[int],
+    seed: int,
+    repeats: int,
+    warmup: int,
+    database_name: str,
+    output: typing.Optional[pathlib.Path],
+    previous: typing.Optional[pathlib.Path],
+):
+    mongodb_client, _ = dataset.connect(database_name)
+
+    report: typing.Dict[str, typing.Any] = {
+        "created_at": datetime.datetime.now(datetime.timezone.utc).isoformat(),
+        "commit": get_git_commit(),
+        "python": platform.python_version(),
+        "seed": seed,
+        "repeats": repeats,
+        "window_days": WINDOW_DAYS,
+        "scales": [],
+    }
+
+    try:
+        report["mongod"] = (await database.mongodb_database.command("buildInfo"))[
+            "version"
+        ]
+
+        for items in scales:
+            scale_results = await run_scale(database_name, items, seed, repeats, warmup)
+            report["scales"].append(scale_results)
+
+            for profile, profile_results in scale_results["profiles"].items():
+                for name, result in profile_results["operations"].items():
+                    print(
+                        f"{items:>9} {profile:<13} {name:<36} "
+                        f"median {result['median_ms']:10.3f} ms "
+                        f"p95 {result['p95_ms']:10.3f} ms "
+                        f"({result['results']} results)"
+                    )
+    finally:
+        await mongodb_client.drop_database(database_name)
+        mongodb_client.close()
+
+    if output is None:
+        RESULTS_DIR.mkdir(exist_ok=True)
+        output = RESULTS_DIR / f"database-{time.strftime('%Y%m%d-%H%M%S')}.json"
+
+    output.write_text(json.dumps(report, indent=2))
+    print(f"results written to {output}")
+
+    if previous is not None:
+        for line in compare(report, json.loads(previous.read_text())):
+            print(line)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Time FinanceItemWrapper reads against seeded datasets."
+    )
+    parser.add_argument("--scales", type=int, nargs="+", default=DEFAULT_SCALES)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--repeats", type=int, default=5)
+    parser.add_argument("--warmup", type=int, default=1)
+    parser.add_argument("--database", default="finance_benchmark")
+    parser.add_argument("--output", type=pathlib.Path)
+    parser.add_argument("--compare", type=pathlib.Path)
+    args = parser.parse_args()
+
+    asyncio.run(
+        main(
+            args.scales,
+            args.seed,
+            args.repeats,
+            args.warmup,
+            args.database,
+            args.output,
+            args.compare,
+        )
+    )
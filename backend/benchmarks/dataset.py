@@ -0,0 +1,383 @@
+import argparse
+import asyncio
+import datetime
+import json
+import os
+import time
+import typing
+
+import bson
+import helpers.database as database
+import numpy as np
+import pytz
+from finances import functions, ingestion, rollups, subscription_occurrences
+from helpers.currencies import currencies
+
+START_DATE = datetime.datetime(2021, 1, 1)
+SPAN_DAYS = 5 * 365
+INSERT_BATCH_SIZE = 10_000
+ITEMS_PER_USER = 5_000
+SUBSCRIPTION_RATIO = 0.01
+ENDED_SUBSCRIPTION_RATIO = 0.3
+HOME_CURRENCY_RATIO = 0.85
+
+TIMEZONES = {
+    "Europe/Warsaw": 0.3,
+    "America/New_York": 0.2,
+    "UTC": 0.15,
+    "Asia/Tokyo": 0.1,
+    "Australia/Sydney": 0.1,
+    "America/Los_Angeles": 0.15,
+}
+HOME_CURRENCIES = {
+    "Europe/Warsaw": "PLN",
+    "America/New_York": "USD",
+    "UTC": "EUR",
+    "Asia/Tokyo": "JPY",
+    "Australia/Sydney": "AUD",
+    "America/Los_Angeles": "USD",
+}
+CATEGORY_WEIGHTS = {"food": 3.0, "groceries": 3.0, "payment": 2.0}
+SUBSCRIPTION_CATEGORY_WEIGHTS = {"payment": 3.0, "entertainment": 2.0}
+CATEGORIES = {
+    category: CATEGORY_WEIGHTS.get(category, 1.0) for category in ingestion.categories
+}
+SUBSCRIPTION_CATEGORIES = {
+    category: SUBSCRIPTION_CATEGORY_WEIGHTS.get(category, 0.0)
+    for category in ingestion.categories
+}
+REPEAT_PERIODS = {"month": 0.6, "week": 0.15, "year": 0.15, "day": 0.1}
+CURRENCY_SCALES = {"JPY": 150.0, "CNY": 7.0, "PLN": 4.0}
+USD_RATES = {
+    "PLN": 4.0,
+    "USD": 1.0,
+    "EUR": 0.92,
+    "JPY": 150.0,
+    "GBP": 0.79,
+    "CNY": 7.2,
+    "AUD": 1.52,
+    "CAD": 1.36,
+    "CHF": 0.88,
+}
+
+
+class SyntheticUser(typing.NamedTuple):
+    id: bson.ObjectId
+    username: str
+    timezone: str
+    currency: str
+    items: int
+    subscriptions: int
+
+
+def _choice(
+    rng: np.random.Generator, weights: typing.Dict[str, float], size: int
+) -> np.ndarray:
+    probabilities = np.array(list(weights.values()))
+
+    return rng.choice(list(weights), size=size, p=probabilities / probabilities.sum())
+
+
+def get_utc_offsets(timezone: str) -> np.ndarray:
+    local_tz = pytz.timezone(timezone)
+
+    return np.array(
+        [
+            local_tz.utcoffset(START_DATE + datetime.timedelta(days=day, hours=12))
+            // datetime.timedelta(seconds=1)
+            for day in range(SPAN_DAYS)
+        ],
+        dtype=np.int64,
+    )
+
+
+def generate_users(
+    rng: np.random.Generator, items: int, users: int
+) -> typing.List[SyntheticUser]:
+    weights = rng.pareto(1.5, users) + 1
+    item_counts = rng.multinomial(items, weights / weights.sum())
+    timezones = _choice(rng, TIMEZONES, users)
+
+    return [
+        SyntheticUser(
+            id=bson.ObjectId(),
+            username=f"benchmark-{index}",
+            timezone=str(timezone),
+            currency=HOME_CURRENCIES[str(timezone)],
+            items=int(count - round(count * SUBSCRIPTION_RATIO)),
+            subscriptions=int(round(count * SUBSCRIPTION_RATIO)),
+        )
+        for index, (count, timezone) in enumerate(zip(item_counts, timezones))
+    ]
+
+
+def generate_amounts(
+    rng: np.random.Generator, item_currencies: np.ndarray, mean: float = 3.0
+) -> np.ndarray:
+    scales = np.array([CURRENCY_SCALES.get(code, 1.0) for code in item_currencies])
+
+    return np.round(rng.lognormal(mean, 1.0, len(item_currencies)) * scales, 2)
+
+
+def generate_currencies(
+    rng: np.random.Generator, home_currency: str, size: int
+) -> np.ndarray:
+    return np.where(
+        rng.random(size) < HOME_CURRENCY_RATIO,
+        home_currency,
+        rng.choice(currencies, size=size),
+    )
+
+
+def generate_dates(
+    rng: np.random.Generator, utc_offsets: np.ndarray, size: int
+) -> typing.List[datetime.datetime]:
+    days = rng.integers(0, SPAN_DAYS, size)
+    seconds = np.clip(rng.normal(14 * 3600, 4 * 3600, size), 0, 86399).astype(np.int64)
+
+    timestamps = (
+        np.datetime64(START_DATE, "s") + days * 86400 + seconds - utc_offsets[days]
+    )
+
+    return timestamps.astype("datetime64[ms]").tolist()
+
+
+def generate_items(
+    rng: np.random.Generator,
+    user: SyntheticUser,
+    utc_offsets: np.ndarray,
+    size: int,
+    first_index: int = 0,
+) -> typing.List[typing.Dict[str, typing.Any]]:
+    categories = _choice(rng, CATEGORIES, size)
+    item_currencies = generate_currencies(rng, user.currency, size)
+    amounts = generate_amounts(rng, item_currencies)
+    dates = generate_dates(rng, utc_offsets, size)
+
+    return [
+        {
+            "name": f"{category} {index}",
+            "amount": amount,
+            "date": date,
+            "category": category,
+            "user": user.id,
+            "currency": currency,
+            "is_subscription": False,
+        }
+        for index, (category, currency, amount, date) in enumerate(
+            zip(
+                categories.tolist(),
+                item_currencies.tolist(),
+                amounts.tolist(),
+                dates,
+            ),
+            start=first_index,
+        )
+    ]
+
+
+def generate_subscriptions(
+    rng: np.random.Generator, user: SyntheticUser, utc_offsets: np.ndarray
+) -> typing.List[typing.Dict[str, typing.Any]]:
+    size = user.subscriptions
+    categories = _choice(rng, SUBSCRIPTION_CATEGORIES, size)
+    repeat_periods = _choice(rng, REPEAT_PERIODS, size)
+    repeat_values = np.where(rng.random(size) < 0.8, 1, rng.integers(2, 4, size))
+    item_currencies = np.full(size, user.currency)
+    amounts = generate_amounts(rng, item_currencies, mean=2.5)
+    start_dates = generate_dates(rng, utc_offsets, size)
+    ended = rng.random(size) < ENDED_SUBSCRIPTION_RATIO
+    durations = rng.integers(30, SPAN_DAYS, size)
+
+    subscriptions = []
+    for index in range(size):
+        start_date = start_dates[index]
+        end_date = None
+        if ended[index]:
+            end_date = start_date + datetime.timedelta(days=int(durations[index]))
+
+        subscriptions.append(
+            {
+                "name": f"{categories[index]} subscription {index}",
+                "amount": float(amounts[index]),
+                "date": start_date,
+                "category": str(categories[index]),
+                "user": user.id,
+                "currency": user.currency,
+                "is_subscription": True,
+                "start_date": start_date,
+                "end_date": end_date,
+                "repeat_period": str(repeat_periods[index]),
+                "repeat_value": int(repeat_values[index]),
+                "version": 0,
+                "supersedes": None,
+            }
+        )
+
+    return subscriptions
+
+
+async def insert_batches(
+    collection_name: str, docs: typing.Iterator[typing.Dict[str, typing.Any]]
+) -> int:
+    collection = database.get_collection(collection_name)
+    inserted = 0
+    batch: typing.List[typing.Dict[str, typing.Any]] = []
+
+    for doc in docs:
+        batch.append(doc)
+
+        if len(batch) == INSERT_BATCH_SIZE:
+            await collection.insert_many(batch, ordered=False)
+            inserted += len(batch)
+            batch = []
+
+    if batch:
+        await collection.insert_many(batch, ordered=False)
+        inserted += len(batch)
+
+    return inserted
+
+
+def iter_user_items(
+    rng: np.random.Generator,
+    user: SyntheticUser,
+    utc_offsets: np.ndarray,
+) -> typing.Iterator[typing.Dict[str, typing.Any]]:
+    for chunk_start in range(0, user.items, INSERT_BATCH_SIZE):
+        yield from generate_items(
+            rng,
+            user,
+            utc_offsets,
+            min(INSERT_BATCH_SIZE, user.items - chunk_start),
+            chunk_start,
+        )
+
+
+async def seed_currency_rates() -> None:
+    cross_rates = functions.derive_cross_rates(
+        functions.BASE_CURRENCY,
+        {
+            currency: rate / USD_RATES[functions.BASE_CURRENCY]
+            for currency, rate in USD_RATES.items()
+            if currency != functions.BASE_CURRENCY
+        },
+    )
+
+    collection = database.get_collection("currency_rates")
+    for currency, currency_rates in cross_rates.items():
+        await collection.replace_one({"_id": currency}, currency_rates, upsert=True)
+
+    await collection.replace_one(
+        {"_id": "update_date"}, {"date": datetime.datetime.now()}, upsert=True
+    )
+
+
+async def generate(
+    items: int,
+    users: typing.Optional[int] = None,
+    seed: int = 0,
+    derived: bool = True,
+) -> typing.List[SyntheticUser]:
+    rng = np.random.default_rng(seed)
+    users = users or max(1, items // ITEMS_PER_USER)
+    synthetic_users = generate_users(rng, items, users)
+    utc_offsets = {timezone: get_utc_offsets(timezone) for timezone in TIMEZONES}
+
+    await database.get_collection("users").insert_many(
+        [
+            {
+                "_id": user.id,
+                "username": user.username,
+                "password": "",
+                "currency": user.currency,
+                "timezone": user.timezone,
+            }
+            for user in synthetic_users
+        ]
+    )
+
+    for user in synthetic_users:
+        await insert_batches(
+            "finances", iter_user_items(rng, user, utc_offsets[user.timezone])
+        )
+
+        if user.subscriptions:
+            await insert_batches(
+                "subscriptions",
+                iter(generate_subscriptions(rng, user, utc_offsets[user.timezone])),
+            )
+
+    await seed_currency_rates()
+
+    if derived:
+        await rollups.backfill()
+        await subscription_occurrences.extend_all()
+
+    return synthetic_users
+
+
+async def reset(database_name: str) -> None:
+    await database.mongodb_client.drop_database(database_name)
+    database.collections.clear()
+    database.mongodb_database = database.mongodb_client.get_database(database_name)
+    await database.ensure_indexes()
+
+
+def connect(database_name: str):
+    if database_name == os.getenv("DATABASE_NAME"):
+        raise ValueError(f"Refusing to reset the application database {database_name}")
+
+    os.environ["DATABASE_NAME"] = database_name
+
+    return database.init_database()
+
+
+async def main(
+    items: int,
+    users: typing.Optional[int],
+    seed: int,
+    database_name: str,
+    derived: bool,
+):
+    mongodb_client, _ = connect(database_name)
+
+    try:
+        await reset(database_name)
+
+        started = time.perf_counter()
+        synthetic_users = await generate(items, users, seed, derived)
+        elapsed = time.perf_counter() - started
+    finally:
+        mongodb_client.close()
+
+    print(
+        json.dumps(
+            {
+                "database": database_name,
+                "seed": seed,
+                "items": items,
+                "users": len(synthetic_users),
+                "subscriptions": sum(user.subscriptions for user in synthetic_users),
+                "largest_user_items": max(user.items for user in synthetic_users),
+                "elapsed_s": round(elapsed, 2),
+            },
+            indent=2,
+        )
+    )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Generate a seeded synthetic finance dataset in a local mongod."
+    )
+    parser.add_argument("--items", type=int, default=100_000)
+    parser.add_argument("--users", type=int)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--database", default="finance_benchmark")
+    parser.add_argument("--skip-derived", action="store_true")
+    args = parser.parse_args()
+
+    asyncio.run(
+        main(args.items, args.users, args.seed, args.database, not args.skip_derived)
+    )
@@ -0,0 +1,128 @@
+import argparse
+import asyncio
+import datetime
+import time
+import typing
+
+import auth.functions as auth_functions
+import auth.models as auth_models
+import bson
+import fastapi
+import httpx
+import pytz
+from finances import models
+from finances.routes import router as finances_router
+
+START_DATE = datetime.datetime(2020, 1, 1, tzinfo=pytz.utc)
+
+
+def generate_docs(count: int, user_id: bson.ObjectId) -> typing.List[dict]:
+    return [
+        {
+            "_id": bson.ObjectId(),
+            "name": f"Item {index}",
+            "amount": round(index * 1.37 % 500, 2),
+            "date": START_DATE + datetime.timedelta(minutes=index * 17),
+            "category": "food",
+            "user": user_id,
+            "currency": "PLN",
+            "is_subscription": False,
+        }
+        for index in range(count)
+    ]
+
+
+class InMemoryWrapper:
+    def __init__(self, docs: typing.List[dict]):
+        self.docs = docs
+
+    async def list_items(self, start_date, end_date, user_id, after=None):
+        for doc in self.docs:
+            yield models.FinanceItem(**doc)
+
+    async def list_item_documents(self, start_date, end_date, user_id, after=None):
+        for doc in self.docs:
+            yield models.to_lean_document(doc)
+
+
+def create_app(docs: typing.List[dict], user: auth_models.User) -> fastapi.FastAPI:
+    app = fastapi.FastAPI()
+
+    @app.get(
+        "/model/",
+        response_model=typing.List[
+            typing.Union[models.FinanceItem, models.SubscriptionItem]
+        ],
+        response_model_by_alias=False,
+    )
+    async def list_model_items(
+        finance_wrapper: InMemoryWrapper = fastapi.Depends(models.get_finance_wrapper),
+    ) -> typing.List[typing.Union[models.FinanceItem, models.SubscriptionItem]]:
+        generator = finance_wrapper.list_items(None, None, None)
+
+        return [item async for item in generator]
+
+    app.include_router(finances_router)
+
+    app.dependency_overrides[auth_functions.get_current_user] = lambda: user
+    app.dependency_overrides[models.get_finance_wrapper] = lambda: InMemoryWrapper(docs)
+
+    return app
+
+
+async def measure(
+    client: httpx.AsyncClient, url: str, requests: int
+) -> typing.Dict[str, float]:
+    params = {"startDate": "2020-01-01", "endDate": "2030-01-01"}
+
+    response = await client.get(url, params=params)
+    response.raise_for_status()
+
+    started = time.perf_counter()
+    for _ in range(requests):
+        response = await client.get(url, params=params)
+        response.raise_for_status()
+    elapsed = time.perf_counter() - started
+
+    return {
+        "requests_per_second": requests / elapsed,
+        "mean_latency_ms": elapsed / requests * 1000,
+        "response_bytes": len(response.content),
+    }
+
+
+async def main(items: int, requests: int):
+    user = auth_models.User(_id=bson.ObjectId(), username="benchmark", password="")
+    app = create_app(generate_docs(items, user.id), user)
+
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(
+        transport=transport, base_url="http://bench"
+    ) as client:
+        results = {
+            "model": await measure(client, "/model/", requests),
+            "lean": await measure(client, "/finances/", requests),
+        }
+
+    for name, result in results.items():
+        print(
+            f"{name:>6}: {result['requests_per_second']:8.2f} req/s "
+            f"{result['mean_latency_ms']:9.2f} ms/req "
+            f"{result['response_bytes']:>10} bytes"
+        )
+
+    speedup = (
+        results["lean"]["requests_per_second"] / results["model"]["requests_per_second"]
+    )
+    print(f"speedup: {speedup:.2f}x")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Compare the pydantic response path with the lean read path."
+    )
+    parser.add_argument("--items", type=int, default=10_000)
+    parser.add_argument("--requests", type=int, default=20)
+    args = parser.parse_args()
+
+    asyncio.run(main(args.items, args.requests))
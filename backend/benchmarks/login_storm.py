@@ -0,0 +1,87 @@
+import argparse
+import asyncio
+import statistics
+import time
+import typing
+
+import fastapi
+from auth import functions
+
+PASSWORD = "correct horse battery staple"
+TICK_SECONDS = 0.005
+
+
+async def monitor_event_loop(lags: typing.List[float], stop: asyncio.Event):
+    while not stop.is_set():
+        started = time.perf_counter()
+        await asyncio.sleep(TICK_SECONDS)
+        lags.append(time.perf_counter() - started - TICK_SECONDS)
+
+
+async def inline_login(hashed_password: str) -> bool:
+    return functions.verify_password(PASSWORD, hashed_password)
+
+
+async def pooled_login(hashed_password: str) -> bool:
+    is_verified, _ = await functions.verify_and_update_password(
+        PASSWORD, hashed_password
+    )
+    return is_verified
+
+
+async def run_storm(
+    login: typing.Callable[[str], typing.Awaitable[bool]],
+    hashed_password: str,
+    logins: int,
+) -> typing.Dict[str, float]:
+    lags: typing.List[float] = []
+    stop = asyncio.Event()
+    monitor = asyncio.create_task(monitor_event_loop(lags, stop))
+    await asyncio.sleep(TICK_SECONDS * 2)
+
+    started = time.perf_counter()
+    results = await asyncio.gather(
+        *(login(hashed_password) for _ in range(logins)), return_exceptions=True
+    )
+    elapsed = time.perf_counter() - started
+
+    stop.set()
+    await monitor
+
+    rejected = sum(
+        isinstance(result, fastapi.HTTPException) and result.status_code == 503
+        for result in results
+    )
+    lags_ms = sorted(lag * 1000 for lag in lags) or [0.0]
+
+    return {
+        "elapsed_s": elapsed,
+        "accepted": logins - rejected,
+        "rejected_503": rejected,
+        "lag_p50_ms": statistics.median(lags_ms),
+        "lag_p99_ms": lags_ms[min(len(lags_ms) - 1, int(len(lags_ms) * 0.99))],
+        "lag_max_ms": lags_ms[-1],
+    }
+
+
+async def main(logins: int):
+    hashed_password = functions.get_password_hash(PASSWORD)
+
+    for name, login in [("inline", inline_login), ("pooled", pooled_login)]:
+        result = await run_storm(login, hashed_password, logins)
+        print(
+            f"{name:>6}: {result['elapsed_s']:6.2f} s, "
+            f"accepted {result['accepted']:>4}, 503 {result['rejected_503']:>4}, "
+            f"loop lag p50 {result['lag_p50_ms']:8.2f} ms "
+            f"p99 {result['lag_p99_ms']:8.2f} ms max {result['lag_max_ms']:8.2f} ms"
+        )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Measure event-loop lag while a burst of logins is verified."
+    )
+    parser.add_argument("--logins", type=int, default=40)
+    args = parser.parse_args()
+
+    asyncio.run(main(args.logins))
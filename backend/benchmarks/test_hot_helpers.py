@@ -0,0 +1,104 @@
+import datetime
+
+import bson
+import pytest
+import pytz
+
+pytest.importorskip("pytest_benchmark")
+
+from finances import models, occurrences  # noqa: E402
+
+TIMEZONE = "Europe/Warsaw"
+OCCURRENCE_WINDOW_DAYS = 365
+REPEAT_PERIODS = ["day", "week", "month", "year"]
+
+NAIVE_DATE = datetime.datetime(2024, 3, 31, 1, 30)
+AWARE_DATE = pytz.utc.localize(datetime.datetime(2024, 3, 31, 1, 30))
+ISO_DATE = "2024-03-31T01:30:00"
+FINANCE_DOC = {
+    "_id": bson.ObjectId(),
+    "name": "Groceries",
+    "amount": 42.5,
+    "date": AWARE_DATE,
+    "category": "food",
+    "user": bson.ObjectId(),
+    "currency": "PLN",
+    "is_subscription": False,
+}
+SUBSCRIPTION_DOC = {
+    **FINANCE_DOC,
+    "is_subscription": True,
+    "start_date": AWARE_DATE,
+    "end_date": None,
+    "repeat_period": "month",
+    "repeat_value": 1,
+}
+
+
+@pytest.fixture
+def wrapper() -> models.FinanceItemWrapper:
+    wrapper = object.__new__(models.FinanceItemWrapper)
+    wrapper.timezone = TIMEZONE
+
+    return wrapper
+
+
+@pytest.fixture
+def window(wrapper: models.FinanceItemWrapper):
+    window_start = wrapper._parse_and_localize_date(NAIVE_DATE)
+
+    return window_start, window_start + datetime.timedelta(days=OCCURRENCE_WINDOW_DAYS)
+
+
+@pytest.mark.parametrize("date", [NAIVE_DATE, AWARE_DATE], ids=["naive", "aware"])
+def test_localize_datetime(benchmark, date: datetime.datetime):
+    benchmark(models.localize_datetime, date, TIMEZONE)
+
+
+@pytest.mark.parametrize("date", [ISO_DATE, AWARE_DATE], ids=["str", "datetime"])
+def test_parse_and_localize_date(benchmark, wrapper: models.FinanceItemWrapper, date):
+    benchmark(wrapper._parse_and_localize_date, date)
+
+
+def test_finance_item_round_trip(benchmark):
+    benchmark(lambda: models.FinanceItem(**FINANCE_DOC).model_dump())
+
+
+def test_subscription_item_round_trip(benchmark):
+    benchmark(lambda: models.SubscriptionItem(**SUBSCRIPTION_DOC).model_dump())
+
+
+@pytest.mark.parametrize("repeat_period", REPEAT_PERIODS)
+def test_iter_occurrence_batches(benchmark, window, repeat_period: str):
+    window_start, window_end = window
+
+    benchmark(
+        lambda: list(
+            occurrences.iter_occurrence_batches(
+                window_start,
+                repeat_period,
+                1,
+                window_start=window_start,
+                window_end=window_end,
+                timezone=TIMEZONE,
+            )
+        )
+    )
+
+
+@pytest.mark.parametrize("repeat_period", REPEAT_PERIODS)
+def test_iter_occurrences(benchmark, window, repeat_period: str):
+    window_start, window_end = window
+
+    benchmark(
+        lambda: list(
+            occurrences.iter_occurrences(
+                window_start,
+                repeat_period,
+                1,
+                window_start=window_start,
+                window_end=window_end,
+                timezone=TIMEZONE,
+            )
+        )
+    )
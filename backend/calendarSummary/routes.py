@@ -4,6 +4,9 @@ import auth.functions as auth_functions
 import auth.models as auth_models
 import fastapi
 import finances.models as finances_models
+import finances.rates as finances_rates
+from helpers.currencies import currencies
+from helpers.responses import LeanJSONResponse
 
 router = fastapi.APIRouter(
     prefix="/calendar",
@@ -19,30 +22,27 @@ router = fastapi.APIRouter(
 async def get_calendar_summary(
     startDate: typing.Optional[str] = None,
     endDate: typing.Optional[str] = None,
+    convertTo: typing.Optional[str] = None,
     current_user: auth_models.User = fastapi.Depends(auth_functions.get_current_user),
     finance_wrapper: finances_models.FinanceItemWrapper = fastapi.Depends(
         finances_models.get_finance_wrapper
     ),
-) -> typing.Dict[str, typing.Dict[str, float]]:
+) -> typing.Any:
     if current_user.id is None:
         raise fastapi.HTTPException(status_code=401, detail="User not authenticated")
 
     if startDate is None or endDate is None:
         raise fastapi.HTTPException(status_code=400, detail="Missing dates")
 
-    generator = finance_wrapper.list_items(startDate, endDate, current_user.id)
+    if convertTo is not None and convertTo not in currencies:
+        raise fastapi.HTTPException(status_code=400, detail="Unsupported currency")
 
-    summary = {}
-    async for item in generator:
-        string_date = item.date.strftime("%Y-%m-%d")
-        currency = item.currency
+    summary = await finance_wrapper.summarize_items(startDate, endDate, current_user.id)
 
-        if string_date not in summary:
-            summary[string_date] = {}
+    if convertTo is not None:
+        try:
+            summary = finances_rates.currency_rates.convert_summary(summary, convertTo)
+        except ValueError as e:
+            raise fastapi.HTTPException(status_code=503, detail=str(e))
 
-        if currency not in summary[string_date]:
-            summary[string_date][currency] = 0
-
-        summary[string_date][currency] += round(item.amount, 2)
-
-    return summary
+    return LeanJSONResponse(summary)
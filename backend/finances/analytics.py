@@ -0,0 +1,101 @@
+import datetime
+import typing
+
+import numpy as np
+
+from . import rates
+
+EPOCH = datetime.date(1970, 1, 1)
+
+
+class ItemColumns(typing.NamedTuple):
+    days: np.ndarray
+    amounts: np.ndarray
+    category_codes: np.ndarray
+    currency_codes: np.ndarray
+    categories: typing.List[str]
+    currencies: typing.List[str]
+
+
+async def load_columns(
+    docs: typing.AsyncIterator[typing.Dict[str, typing.Any]],
+) -> ItemColumns:
+    days: typing.List[int] = []
+    amounts: typing.List[float] = []
+    category_codes: typing.List[int] = []
+    currency_codes: typing.List[int] = []
+    category_index: typing.Dict[str, int] = {}
+    currency_index: typing.Dict[str, int] = {}
+
+    async for doc in docs:
+        days.append((doc["date"].date() - EPOCH).days)
+        amounts.append(doc["amount"])
+        category_codes.append(
+            category_index.setdefault(doc["category"], len(category_index))
+        )
+        currency_codes.append(
+            currency_index.setdefault(doc["currency"], len(currency_index))
+        )
+
+    return ItemColumns(
+        days=np.array(days, dtype=np.int64),
+        amounts=np.array(amounts, dtype=np.float64),
+        category_codes=np.array(category_codes, dtype=np.int16),
+        currency_codes=np.array(currency_codes, dtype=np.int16),
+        categories=list(category_index),
+        currencies=list(currency_index),
+    )
+
+
+def get_period_starts(days: np.ndarray, period: str) -> np.ndarray:
+    match period:
+        case "week":
+            return days - (days + 3) % 7
+        case "month":
+            return (
+                days.astype("datetime64[D]")
+                .astype("datetime64[M]")
+                .astype("datetime64[D]")
+                .astype(np.int64)
+            )
+
+    return days
+
+
+def build_matrix(
+    columns: ItemColumns, period: str, currency: typing.Optional[str] = None
+) -> typing.Dict[str, typing.Any]:
+    amounts = columns.amounts
+    currency_codes = columns.currency_codes
+    matrix_currencies = columns.currencies
+
+    if currency is not None:
+        source_indexes = rates.currency_rates.get_indexes(columns.currencies)
+        amounts = rates.currency_rates.convert_indexed_amounts(
+            amounts, source_indexes[currency_codes], currency
+        )
+        currency_codes = np.zeros_like(currency_codes)
+        matrix_currencies = [currency]
+
+    period_starts, period_codes = np.unique(
+        get_period_starts(columns.days, period), return_inverse=True
+    )
+
+    shape = (len(matrix_currencies), len(columns.categories), len(period_starts))
+    cells = np.ravel_multi_index(
+        (currency_codes, columns.category_codes, period_codes), shape
+    )
+    totals = np.bincount(cells, weights=amounts, minlength=int(np.prod(shape)))
+    totals = np.round(totals.reshape(shape), 2)
+
+    return {
+        "period": period,
+        "periods": np.datetime_as_string(
+            period_starts.astype("datetime64[D]"), unit="D"
+        ).tolist(),
+        "categories": columns.categories,
+        "totals": {
+            matrix_currency: totals[index].tolist()
+            for index, matrix_currency in enumerate(matrix_currencies)
+        },
+    }
@@ -0,0 +1,284 @@
+import codecs
+import csv
+import datetime
+import hashlib
+import re
+import typing
+
+import pydantic
+from helpers.currencies import currencies
+from starlette.datastructures import UploadFile
+
+READ_CHUNK_SIZE = 64 * 1024
+SUPPORTED_ENCODINGS = ["utf-8", "cp1250", "latin-1"]
+DELIMITERS = [";", ",", "\t", "|"]
+DATE_FORMATS = [
+    "%Y-%m-%d",
+    "%d.%m.%Y",
+    "%d-%m-%Y",
+    "%d/%m/%Y",
+    "%m/%d/%Y",
+    "%Y/%m/%d",
+    "%Y.%m.%d",
+    "%Y-%m-%d %H:%M:%S",
+    "%d.%m.%Y %H:%M:%S",
+    "%d.%m.%Y %H:%M",
+]
+PROFILE_SAMPLE_ROWS = 20
+
+AMOUNT_PATTERN = re.compile(r"[+\-]?\s*[\d\s.,]*\d(\s*[A-Za-z]{3})?")
+
+
+class ColumnMapping(pydantic.BaseModel):
+    delimiter: str = pydantic.Field(description="The CSV column delimiter.")
+    date_column: int = pydantic.Field(
+        description="Zero-based index of the column with the payment date."
+    )
+    amount_column: int = pydantic.Field(
+        description="Zero-based index of the column with the payment amount."
+    )
+    title_column: int = pydantic.Field(
+        description="Zero-based index of the column with the payment description."
+    )
+    currency_column: typing.Optional[int] = pydantic.Field(
+        default=None,
+        description="Zero-based index of the column with the currency code, if any.",
+    )
+    category_column: typing.Optional[int] = pydantic.Field(
+        default=None,
+        description="Zero-based index of the column with the payment category, if any.",
+    )
+    default_currency: str = pydantic.Field(
+        default="USD",
+        description="Currency code to use when there is no currency column.",
+    )
+    decimal_separator: typing.Literal[".", ","] = pydantic.Field(
+        description="The decimal separator used in amounts."
+    )
+    date_format: str = pydantic.Field(
+        description="The Python strptime format of the date column, e.g. %d.%m.%Y."
+    )
+
+
+class ParsedRow(typing.NamedTuple):
+    title: str
+    amount: float
+    currency: str
+    date: str
+    category: typing.Optional[str]
+
+
+def detect_encoding(sample: bytes) -> str:
+    if sample.startswith(codecs.BOM_UTF8):
+        return "utf-8-sig"
+
+    for encoding in SUPPORTED_ENCODINGS:
+        try:
+            codecs.getincrementaldecoder(encoding)().decode(sample, final=False)
+            return encoding
+        except UnicodeDecodeError:
+            continue
+
+    return "latin-1"
+
+
+async def read_lines(
+    file: UploadFile, chunk_size: int = READ_CHUNK_SIZE
+) -> typing.List[str]:
+    sample = await file.read(chunk_size)
+    encoding = detect_encoding(sample)
+
+    while True:
+        try:
+            return await _decode_lines(file, sample, encoding, chunk_size)
+        except UnicodeDecodeError:
+            encoding = SUPPORTED_ENCODINGS[
+                SUPPORTED_ENCODINGS.index(encoding.removesuffix("-sig")) + 1
+            ]
+            await file.seek(0)
+            sample = await file.read(chunk_size)
+
+
+async def _decode_lines(
+    file: UploadFile, sample: bytes, encoding: str, chunk_size: int
+) -> typing.List[str]:
+    decoder = codecs.getincrementaldecoder(encoding)()
+
+    lines: typing.List[str] = []
+    pending = ""
+    chunk = sample
+
+    while chunk:
+        pending += decoder.decode(chunk)
+        *complete_lines, pending = pending.splitlines(keepends=True) or [""]
+        lines.extend(line.rstrip("\r\n") for line in complete_lines)
+
+        chunk = await file.read(chunk_size)
+
+    pending += decoder.decode(b"", final=True)
+    lines.extend(pending.splitlines())
+
+    return [line for line in lines if line.strip()]
+
+
+def detect_delimiter(header: str) -> str:
+    return max(DELIMITERS, key=header.count)
+
+
+def split_row(row: str, delimiter: str) -> typing.List[str]:
+    return [field.strip() for field in next(csv.reader([row], delimiter=delimiter))]
+
+
+def fingerprint_header(header: str) -> str:
+    delimiter = detect_delimiter(header)
+    columns = [
+        column.lower() for column in split_row(header.lstrip("\ufeff"), delimiter)
+    ]
+
+    return hashlib.sha256(
+        "\x1f".join([delimiter, *columns]).encode("utf-8")
+    ).hexdigest()
+
+
+def parse_amount(value: str, decimal_separator: str) -> float:
+    value = re.sub(r"[^\d,.\-+]", "", value)
+    thousands_separator = "," if decimal_separator == "." else "."
+
+    return float(value.replace(thousands_separator, "").replace(decimal_separator, "."))
+
+
+def parse_row(row: str, mapping: ColumnMapping) -> ParsedRow:
+    fields = split_row(row, mapping.delimiter)
+
+    currency = mapping.default_currency
+    if mapping.currency_column is not None:
+        currency = fields[mapping.currency_column].upper() or currency
+
+    category = None
+    if mapping.category_column is not None:
+        category = fields[mapping.category_column].lower() or None
+
+    return ParsedRow(
+        title=fields[mapping.title_column],
+        amount=parse_amount(fields[mapping.amount_column], mapping.decimal_separator),
+        currency=currency,
+        date=datetime.datetime.strptime(
+            fields[mapping.date_column], mapping.date_format
+        )
+        .date()
+        .isoformat(),
+        category=category,
+    )
+
+
+def parse_rows(
+    rows: typing.List[str], mapping: ColumnMapping
+) -> typing.Tuple[typing.List[ParsedRow], typing.List[int]]:
+    parsed_rows = []
+    failed_rows = []
+
+    for index, row in enumerate(rows):
+        try:
+            parsed_rows.append(parse_row(row, mapping))
+        except (ValueError, IndexError):
+            failed_rows.append(index)
+
+    return parsed_rows, failed_rows
+
+
+def validate_mapping(mapping: ColumnMapping, rows: typing.List[str]) -> bool:
+    if not rows:
+        return False
+
+    parsed_rows, failed_rows = parse_rows(rows, mapping)
+
+    return not failed_rows and all(
+        parsed_row.currency in currencies for parsed_row in parsed_rows
+    )
+
+
+def infer_mapping(
+    header: str, rows: typing.List[str]
+) -> typing.Optional[ColumnMapping]:
+    delimiter = detect_delimiter(header)
+    sample = [split_row(row, delimiter) for row in rows]
+    column_count = len(split_row(header, delimiter))
+
+    def column_values(column: int) -> typing.List[str]:
+        return [fields[column] for fields in sample if column < len(fields)]
+
+    date_column = date_format = None
+    for column in range(column_count):
+        if (date_format := _detect_date_format(column_values(column))) is not None:
+            date_column = column
+            break
+
+    currency_column = next(
+        (
+            column
+            for column in range(column_count)
+            if column_values(column)
+            and all(value.upper() in currencies for value in column_values(column))
+        ),
+        None,
+    )
+
+    amount_column = decimal_separator = None
+    for column in range(column_count):
+        if column in (date_column, currency_column):
+            continue
+
+        values = column_values(column)
+        if values and all(AMOUNT_PATTERN.fullmatch(value) for value in values):
+            amount_column = column
+            decimal_separator = (
+                "," if any(re.search(r",\d{1,2}$", value) for value in values) else "."
+            )
+            break
+
+    title_column = max(
+        (
+            column
+            for column in range(column_count)
+            if column not in (date_column, currency_column, amount_column)
+            and not all(
+                AMOUNT_PATTERN.fullmatch(value) for value in column_values(column)
+            )
+        ),
+        key=lambda column: sum(len(value) for value in column_values(column)),
+        default=None,
+    )
+
+    if (
+        date_column is None
+        or date_format is None
+        or amount_column is None
+        or decimal_separator is None
+        or title_column is None
+    ):
+        return None
+
+    return ColumnMapping(
+        delimiter=delimiter,
+        date_column=date_column,
+        amount_column=amount_column,
+        title_column=title_column,
+        currency_column=currency_column,
+        decimal_separator=decimal_separator,
+        date_format=date_format,
+    )
+
+
+def _detect_date_format(values: typing.List[str]) -> typing.Optional[str]:
+    if not values:
+        return None
+
+    for date_format in DATE_FORMATS:
+        try:
+            for value in values:
+                datetime.datetime.strptime(value, date_format)
+            return date_format
+        except ValueError:
+            continue
+
+    return None
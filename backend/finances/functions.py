@@ -1,16 +1,24 @@
+import asyncio
+import base64
 import datetime
+import json
+import logging
 import os
+import random
 import typing
 
+import bson
 import helpers.database as database
-import pydantic
-import requests
+import helpers.metrics as metrics
+import httpx
+import numpy as np
+import pymongo
+import pymongo.errors
 from helpers.currencies import currencies
-from langchain_core.output_parsers import JsonOutputParser
-from langchain_core.prompts import PromptTemplate
-from langchain_google_genai import ChatGoogleGenerativeAI
 
-from . import models
+from . import models, rates
+
+logger = logging.getLogger(__name__)
 
 
 def is_model_subscription(
@@ -23,135 +31,210 @@ def is_model_subscription(
     )
 
 
-langchain_template = (
-    "You are tasked with extracting specific information about payments from the CSV file: {file_content}. "
-    "Format the response in this JSON format: {format_instructions}. "
-    "Please follow these instructions carefully: \n\n"
-    "1. **No Extra Content:** Do not include any additional text, comments, or explanations in your response. "
-    "2. **Empty Response:** If no information matches the description, return an empty string ('')."
-    "3. **Direct Data Only:** Your output should contain only the data that is explicitly requested, with no other text."
-)
-
-categories = [
-    "entertainment",
-    "food",
-    "groceries",
-    "payment",
-    "others",
-]
-
+def encode_page_cursor(
+    date: datetime.datetime, item_id: typing.Union[str, bson.ObjectId]
+) -> str:
+    payload = json.dumps({"date": date.isoformat(), "id": str(item_id)})
 
-class BotResponse(pydantic.BaseModel):
-    title: str = pydantic.Field(
-        description="The title of the payment readable for the user."
-    )
-    amount: float = pydantic.Field(description="The amount of the payment.")
-    currency: str = pydantic.Field(description="The currency of the payment.")
-    date: str = pydantic.Field(description="Full date of the payment in ISO standard.")
-    category: str = pydantic.Field(
-        description=f"The category of the content. Choose one from the list: [{', '.join(categories)}]"
-    )
+    return base64.urlsafe_b64encode(payload.encode("utf-8")).decode("ascii")
 
 
-class BotResponseList(pydantic.BaseModel):
-    items: typing.List[BotResponse] = pydantic.Field(
-        description="List of payment items"
-    )
+def decode_page_cursor(
+    cursor: str,
+) -> typing.Tuple[datetime.datetime, bson.ObjectId]:
+    try:
+        payload = json.loads(base64.urlsafe_b64decode(cursor.encode("ascii")))
 
+        return (
+            datetime.datetime.fromisoformat(payload["date"]),
+            bson.ObjectId(payload["id"]),
+        )
+    except (ValueError, KeyError, TypeError, bson.errors.InvalidId):
+        raise ValueError("Invalid page cursor")
 
-def ask_bot(content: typing.List[str]) -> typing.List[BotResponse]:
-    api_key = os.environ.get("GEMINI_API_KEY")
 
-    if not api_key:
-        raise ValueError("GEMINI_API_KEY environment variable is not set.")
-
-    model = ChatGoogleGenerativeAI(
-        api_key=api_key,  # type: ignore
-        model="gemini-2.0-flash",
-        temperature=0,
-        max_tokens=None,
-        timeout=None,
-        max_retries=2,
-    )
+CURRENCY_API_URL = os.getenv(
+    "CURRENCY_API_URL", "https://api.freecurrencyapi.com/v1/latest"
+)
+CURRENCY_API_TIMEOUT_SECONDS = float(os.getenv("CURRENCY_API_TIMEOUT_SECONDS", "10"))
+BASE_CURRENCY = "USD"
+CURRENCY_RATES_MAX_AGE = datetime.timedelta(days=1)
+CURRENCY_RATES_LOCK_TIMEOUT = datetime.timedelta(minutes=5)
+CURRENCY_RATES_REFRESH_SECONDS = float(
+    os.getenv("CURRENCY_RATES_REFRESH_SECONDS", "3600")
+)
+CURRENCY_RATES_REFRESH_JITTER_SECONDS = float(
+    os.getenv("CURRENCY_RATES_REFRESH_JITTER_SECONDS", "300")
+)
 
-    parser = JsonOutputParser(pydantic_object=BotResponseList)
+RatesFetcher = typing.Callable[[str], typing.Awaitable[typing.Dict[str, float]]]
 
-    prompt = PromptTemplate(
-        template=langchain_template,
-        input_variables=["file_content"],
-        partial_variables={"format_instructions": parser.get_format_instructions()},
-    )
 
-    chain = prompt | model | parser
+async def fetch_base_rates(base_currency: str) -> typing.Dict[str, float]:
+    api_key = os.environ.get("CURRENCY_API_KEY")
+    if not api_key:
+        raise ValueError("CURRENCY_API_KEY environment variable is not set.")
 
-    response = chain.invoke({"file_content": content})
+    other_currencies = [
+        currency for currency in currencies if currency != base_currency
+    ]
+
+    try:
+        async with httpx.AsyncClient(timeout=CURRENCY_API_TIMEOUT_SECONDS) as client:
+            response = await client.get(
+                CURRENCY_API_URL,
+                params={
+                    "apikey": api_key,
+                    "base_currency": base_currency,
+                    "currencies": ",".join(other_currencies),
+                },
+            )
+            response.raise_for_status()
+    except httpx.HTTPError:
+        metrics.currency_rate_fetches.labels(outcome="error").inc()
+        raise
+
+    metrics.currency_rate_fetches.labels(outcome="success").inc()
+
+    return response.json()["data"]
+
+
+def derive_cross_rates(
+    base_currency: str, base_rates: typing.Dict[str, float]
+) -> typing.Dict[str, typing.Dict[str, float]]:
+    base_rates = {**base_rates, base_currency: 1.0}
+
+    missing_currencies = [
+        currency for currency in currencies if not base_rates.get(currency)
+    ]
+    if missing_currencies:
+        raise ValueError(f"Missing rates for: {', '.join(missing_currencies)}")
+
+    return {
+        currency: {
+            other_currency: base_rates[other_currency] / base_rates[currency]
+            for other_currency in currencies
+            if other_currency != currency
+        }
+        for currency in currencies
+    }
+
+
+async def update_currency_rates(
+    fetch_rates: RatesFetcher = fetch_base_rates,
+) -> bool:
+    collection = database.get_collection("currency_rates")
 
-    response_list = BotResponseList(items=response["items"])
+    if not await _are_currency_rates_stale(collection):
+        return False
 
-    for item in response_list.items:
-        if item.category.lower() in categories:
-            item.category = item.category.lower()
-        else:
-            item.category = "others"
+    if (lock_owner := await _acquire_currency_rates_lock(collection)) is None:
+        return False
 
-    return response_list.items
+    try:
+        if not await _are_currency_rates_stale(collection):
+            return False
 
+        cross_rates = derive_cross_rates(
+            BASE_CURRENCY, await fetch_rates(BASE_CURRENCY)
+        )
 
-async def update_currency_rates():
-    collection = database.get_collection("currency_rates")
+        operations = [
+            pymongo.UpdateOne({"_id": currency}, {"$set": currency_rates}, upsert=True)
+            for currency, currency_rates in cross_rates.items()
+        ]
+        operations.append(
+            pymongo.UpdateOne(
+                {"_id": "update_date"},
+                {"$set": {"date": datetime.datetime.now()}},
+                upsert=True,
+            )
+        )
 
-    date_doc_id = "update_date"
-    date_doc = await collection.find_one({"_id": date_doc_id})
+        await collection.bulk_write(operations, ordered=False)
+        await rates.currency_rates.load()
 
-    if date_doc is None:
-        await collection.insert_one(
-            {"_id": date_doc_id, "date": datetime.datetime.now()}
-        )
-        last_update_time = datetime.datetime.now()
-    else:
-        last_update_time = date_doc["date"]
+        return True
 
-    if datetime.datetime.now() - last_update_time < datetime.timedelta(days=1):
-        return
+    finally:
+        await collection.delete_one({"_id": "update_lock", "owner": lock_owner})
 
-    api_key = os.environ.get("CURRENCY_API_KEY")
-    if not api_key:
-        raise ValueError("CURRENCY_API_KEY environment variable is not set.")
 
-    data = {}
-    for currency in currencies:
-        other_currencies = currencies.copy()
-        other_currencies.remove(currency)
-        other_currencies_str = ",".join(other_currencies)
+async def _are_currency_rates_stale(collection) -> bool:
+    date_doc = await collection.find_one({"_id": "update_date"})
 
-        url = f"https://api.freecurrencyapi.com/v1/latest?apikey={api_key}&base_currency={currency}&currencies={other_currencies_str}"
+    if date_doc is None:
+        return True
 
-        response = requests.get(url)
+    return datetime.datetime.now() - date_doc["date"] >= CURRENCY_RATES_MAX_AGE
 
-        data[currency] = response.json()["data"]
 
-    await collection.update_one(
-        {"_id": date_doc_id},
-        {"$set": {"date": datetime.datetime.now()}},
-        upsert=True,
-    )
+async def _acquire_currency_rates_lock(collection) -> typing.Optional[bson.ObjectId]:
+    now = datetime.datetime.now()
+    lock_owner = bson.ObjectId()
 
-    for base_currency, rates in data.items():
+    try:
         await collection.update_one(
-            {"_id": base_currency}, {"$set": rates}, upsert=True
+            {"_id": "update_lock", "expires_at": {"$lt": now}},
+            {
+                "$set": {
+                    "owner": lock_owner,
+                    "expires_at": now + CURRENCY_RATES_LOCK_TIMEOUT,
+                }
+            },
+            upsert=True,
         )
+    except pymongo.errors.DuplicateKeyError:
+        return None
 
+    return lock_owner
 
-async def get_currency_rates():
-    collection = database.get_collection("currency_rates")
 
-    rates_per_currency = {}
+def get_currency_rates() -> typing.Dict[str, typing.Dict[str, float]]:
+    return rates.currency_rates.to_dict()
 
-    for currency in currencies:
-        rates = await collection.find_one({"_id": currency})
 
-        if rates is not None:
-            del rates["_id"]
-            rates_per_currency[currency] = rates
+def convert_documents(
+    docs: typing.List[typing.Dict[str, typing.Any]], currency: str
+) -> typing.List[typing.Dict[str, typing.Any]]:
+    amounts = np.fromiter((doc["amount"] for doc in docs), dtype=float, count=len(docs))
+    converted_amounts = rates.currency_rates.convert_amounts(
+        amounts, [doc["currency"] for doc in docs], currency
+    )
 
-    return rates_per_currency
+    for doc, amount in zip(docs, converted_amounts.tolist()):
+        doc["original_amount"] = doc["amount"]
+        doc["original_currency"] = doc["currency"]
+        doc["amount"] = round(amount, 2)
+        doc["currency"] = currency
+
+    return docs
+
+
+async def run_currency_rates_refresher(
+    interval_seconds: float = CURRENCY_RATES_REFRESH_SECONDS,
+    jitter_seconds: float = CURRENCY_RATES_REFRESH_JITTER_SECONDS,
+):
+    while True:
+        delay = interval_seconds + random.uniform(-jitter_seconds, jitter_seconds)
+
+        try:
+            await asyncio.wait_for(
+                rates.currency_rates.invalidated.wait(), timeout=max(delay, 0)
+            )
+        except asyncio.TimeoutError:
+            pass
+
+        rates.currency_rates.invalidated.clear()
+
+        is_updated = False
+        try:
+            is_updated = await update_currency_rates()
+        except Exception:
+            logger.exception("Currency rates refresh failed")
+
+        if not is_updated:
+            try:
+                await rates.currency_rates.load()
+            except Exception:
+                logger.exception("Currency rates reload failed")
@@ -0,0 +1,844 @@
+import asyncio
+import datetime
+import hashlib
+import json
+import logging
+import os
+import re
+import typing
+
+import helpers.database as database
+import helpers.metrics as metrics
+import pydantic
+import pymongo
+from helpers.currencies import currencies
+from langchain_core.callbacks import CallbackManagerForLLMRun
+from langchain_core.language_models import BaseChatModel
+from langchain_core.messages import AIMessage, BaseMessage
+from langchain_core.output_parsers import JsonOutputParser
+from langchain_core.outputs import ChatGeneration, ChatResult
+from langchain_core.prompts import PromptTemplate
+from langchain_core.runnables import Runnable
+from langchain_google_genai import ChatGoogleGenerativeAI
+
+from . import csv_parser
+
+logger = logging.getLogger(__name__)
+
+LLM_PROVIDER = os.getenv("LLM_PROVIDER", "gemini")
+LLM_MODEL = os.getenv("LLM_MODEL", "gemini-2.0-flash")
+LLM_CHUNK_TOKENS = int(os.getenv("LLM_CHUNK_TOKENS", "2000"))
+LLM_CONCURRENCY = int(os.getenv("LLM_CONCURRENCY", "4"))
+LLM_CHUNK_TIMEOUT_SECONDS = float(os.getenv("LLM_CHUNK_TIMEOUT_SECONDS", "60"))
+LLM_CHUNK_RETRIES = int(os.getenv("LLM_CHUNK_RETRIES", "2"))
+LLM_RETRY_BACKOFF_SECONDS = float(os.getenv("LLM_RETRY_BACKOFF_SECONDS", "1"))
+STUB_LLM_LATENCY_SECONDS = float(os.getenv("STUB_LLM_LATENCY_SECONDS", "0"))
+LLM_CACHE_TTL_SECONDS = int(os.getenv("LLM_CACHE_TTL_SECONDS", str(90 * 24 * 60 * 60)))
+
+PROMPT_VERSION = "2"
+CATEGORY_PROMPT_VERSION = "1"
+
+CHARACTERS_PER_TOKEN = 4
+
+background_tasks: typing.Set[asyncio.Task] = set()
+
+langchain_template = (
+    "You are tasked with extracting specific information about payments from the CSV rows "
+    "between the <csv> tags. The first row is the CSV header, every other row starts with "
+    "its index in square brackets. Return that index in the row field of each item.\n"
+    "<csv>\n{file_content}\n</csv>\n"
+    "Format the response in this JSON format: {format_instructions}. "
+    "Please follow these instructions carefully: \n\n"
+    "1. **No Extra Content:** Do not include any additional text, comments, or explanations in your response. "
+    "2. **Empty Response:** If no information matches the description, return an empty string ('')."
+    "3. **Direct Data Only:** Your output should contain only the data that is explicitly requested, with no other text."
+)
+
+mapping_template = (
+    "You are tasked with describing the layout of a bank statement CSV export. "
+    "The rows between the <sample> tags are the CSV header followed by sample rows.\n"
+    "<sample>\n{file_content}\n</sample>\n"
+    "Format the response in this JSON format: {format_instructions}. "
+    "Please follow these instructions carefully: \n\n"
+    "1. **No Extra Content:** Do not include any additional text, comments, or explanations in your response. "
+    "2. **Column Indexes:** Columns are numbered from 0 in the order they appear in the header. "
+    "3. **Date Format:** Use Python strptime directives for the date format."
+)
+
+category_template = (
+    "You are tasked with assigning a category to payments from a bank statement. "
+    "Every row between the <titles> tags is a payment title that starts with its "
+    "index in square brackets. Return that index in the row field of each item.\n"
+    "<titles>\n{file_content}\n</titles>\n"
+    "Format the response in this JSON format: {format_instructions}. "
+    "Please follow these instructions carefully: \n\n"
+    "1. **No Extra Content:** Do not include any additional text, comments, or explanations in your response. "
+    "2. **One Item Per Row:** Return exactly one item for every row index."
+)
+
+categories = [
+    "entertainment",
+    "food",
+    "groceries",
+    "payment",
+    "others",
+]
+
+
+class BotResponse(pydantic.BaseModel):
+    title: str = pydantic.Field(
+        description="The title of the payment readable for the user."
+    )
+    amount: float = pydantic.Field(description="The amount of the payment.")
+    currency: str = pydantic.Field(description="The currency of the payment.")
+    date: str = pydantic.Field(description="Full date of the payment in ISO standard.")
+    category: str = pydantic.Field(
+        description=f"The category of the content. Choose one from the list: [{', '.join(categories)}]"
+    )
+
+
+class BotRowResponse(BotResponse):
+    row: typing.Optional[int] = pydantic.Field(
+        default=None, description="The index of the CSV row the payment comes from."
+    )
+
+
+class BotResponseList(pydantic.BaseModel):
+    items: typing.List[BotRowResponse] = pydantic.Field(
+        description="List of payment items"
+    )
+
+
+class CategoryResponse(pydantic.BaseModel):
+    row: int = pydantic.Field(description="The index of the title row.")
+    category: str = pydantic.Field(
+        description=f"The category of the payment. Choose one from the list: [{', '.join(categories)}]"
+    )
+
+
+class CategoryResponseList(pydantic.BaseModel):
+    items: typing.List[CategoryResponse] = pydantic.Field(
+        description="List of payment categories"
+    )
+
+
+STUB_CATEGORY_KEYWORDS = {
+    "groceries": [
+        "biedronka",
+        "lidl",
+        "zabka",
+        "żabka",
+        "kaufland",
+        "auchan",
+        "carrefour",
+        "grocery",
+        "market",
+    ],
+    "food": [
+        "restauracja",
+        "restaurant",
+        "pizza",
+        "cafe",
+        "kawiarnia",
+        "mcdonald",
+        "kfc",
+        "burger",
+        "sushi",
+    ],
+    "entertainment": [
+        "netflix",
+        "spotify",
+        "hbo",
+        "disney",
+        "cinema",
+        "kino",
+        "steam",
+        "youtube",
+    ],
+    "payment": ["przelew", "transfer", "blik", "czynsz", "rent", "invoice", "faktura"],
+}
+
+
+class ExtractionStats:
+    def __init__(self):
+        self.rows = 0
+        self.parsed_locally = 0
+        self.cache_lookups = 0
+        self.cache_hits = 0
+
+    def cache_hit_rate(self) -> typing.Optional[float]:
+        if self.cache_lookups == 0:
+            return None
+
+        return self.cache_hits / self.cache_lookups
+
+
+class StubChatModel(BaseChatModel):
+    latency_seconds: float = 0
+
+    @property
+    def _llm_type(self) -> str:
+        return "stub"
+
+    def _generate(
+        self,
+        messages: typing.List[BaseMessage],
+        stop: typing.Optional[typing.List[str]] = None,
+        run_manager: typing.Optional[CallbackManagerForLLMRun] = None,
+        **kwargs: typing.Any,
+    ) -> ChatResult:
+        prompt = "\n".join(str(message.content) for message in messages)
+
+        if (
+            match := re.search(r"<sample>\n(.*?)\n</sample>", prompt, re.DOTALL)
+        ) is not None:
+            header, *rows = match.group(1).splitlines()
+            mapping = csv_parser.infer_mapping(header, rows)
+            message = AIMessage(
+                content=mapping.model_dump_json() if mapping is not None else "{}"
+            )
+
+            return ChatResult(generations=[ChatGeneration(message=message)])
+
+        if (
+            match := re.search(r"<titles>\n(.*?)\n</titles>", prompt, re.DOTALL)
+        ) is not None:
+            items = [
+                {
+                    "row": int(row_match.group(1)),
+                    "category": _guess_stub_category(row_match.group(2)),
+                }
+                for row in match.group(1).splitlines()
+                if (row_match := re.match(r"\[(\d+)\] (.*)", row)) is not None
+            ]
+            message = AIMessage(content=json.dumps({"items": items}))
+
+            return ChatResult(generations=[ChatGeneration(message=message)])
+
+        match = re.search(r"<csv>\n(.*?)\n</csv>", prompt, re.DOTALL)
+        rows = match.group(1).splitlines()[1:] if match is not None else []
+
+        items = []
+        for row in rows:
+            row_match = re.match(r"\[(\d+)\] (.*)", row)
+
+            if (
+                row_match is not None
+                and (item := _parse_stub_row(row_match.group(2))) is not None
+            ):
+                items.append({**item, "row": int(row_match.group(1))})
+
+        message = AIMessage(content=json.dumps({"items": items}))
+
+        return ChatResult(generations=[ChatGeneration(message=message)])
+
+    async def _agenerate(self, *args: typing.Any, **kwargs: typing.Any) -> ChatResult:
+        if self.latency_seconds > 0:
+            await asyncio.sleep(self.latency_seconds)
+
+        return self._generate(*args, **kwargs)
+
+
+def get_chat_model() -> BaseChatModel:
+    if LLM_PROVIDER == "stub":
+        return StubChatModel(latency_seconds=STUB_LLM_LATENCY_SECONDS)
+
+    api_key = os.environ.get("GEMINI_API_KEY")
+
+    if not api_key:
+        raise ValueError("GEMINI_API_KEY environment variable is not set.")
+
+    return ChatGoogleGenerativeAI(
+        api_key=api_key,  # type: ignore
+        model=LLM_MODEL,
+        temperature=0,
+        max_tokens=None,
+        timeout=None,
+        max_retries=0,
+    )
+
+
+def build_chain(model: BaseChatModel) -> Runnable:
+    parser = JsonOutputParser(pydantic_object=BotResponseList)
+
+    prompt = PromptTemplate(
+        template=langchain_template,
+        input_variables=["file_content"],
+        partial_variables={"format_instructions": parser.get_format_instructions()},
+    )
+
+    return prompt | model | parser
+
+
+def build_mapping_chain(model: BaseChatModel) -> Runnable:
+    parser = JsonOutputParser(pydantic_object=csv_parser.ColumnMapping)
+
+    prompt = PromptTemplate(
+        template=mapping_template,
+        input_variables=["file_content"],
+        partial_variables={"format_instructions": parser.get_format_instructions()},
+    )
+
+    return prompt | model | parser
+
+
+def build_category_chain(model: BaseChatModel) -> Runnable:
+    parser = JsonOutputParser(pydantic_object=CategoryResponseList)
+
+    prompt = PromptTemplate(
+        template=category_template,
+        input_variables=["file_content"],
+        partial_variables={"format_instructions": parser.get_format_instructions()},
+    )
+
+    return prompt | model | parser
+
+
+def estimate_tokens(text: str) -> int:
+    return len(text) // CHARACTERS_PER_TOKEN + 1
+
+
+def chunk_rows(
+    rows: typing.List[str], max_tokens: int = LLM_CHUNK_TOKENS
+) -> typing.List[typing.List[str]]:
+    chunks: typing.List[typing.List[str]] = []
+    chunk: typing.List[str] = []
+    chunk_tokens = 0
+
+    for row in rows:
+        row_tokens = estimate_tokens(row)
+
+        if chunk and chunk_tokens + row_tokens > max_tokens:
+            chunks.append(chunk)
+            chunk = []
+            chunk_tokens = 0
+
+        chunk.append(row)
+        chunk_tokens += row_tokens
+
+    if chunk:
+        chunks.append(chunk)
+
+    return chunks
+
+
+async def ask_bot(
+    rows: typing.List[str],
+    header: str,
+    model: typing.Optional[BaseChatModel] = None,
+    stats: typing.Optional[ExtractionStats] = None,
+) -> typing.List[BotResponse]:
+    model = model or get_chat_model()
+    chain = build_chain(model)
+    semaphore = asyncio.Semaphore(LLM_CONCURRENCY)
+
+    header_fingerprint = csv_parser.fingerprint_header(header)
+    model_name = get_model_name(model)
+    keys = [get_row_cache_key(row, header_fingerprint, model_name) for row in rows]
+
+    cached_items = await get_cached_items(keys)
+
+    if stats is not None:
+        stats.cache_lookups += len(keys)
+        stats.cache_hits += sum(key in cached_items for key in keys)
+
+    missing_rows = {key: row for key, row in zip(keys, rows) if key not in cached_items}
+    missing_keys = list(missing_rows)
+
+    chunks = chunk_rows(
+        list(missing_rows.values()),
+        max(LLM_CHUNK_TOKENS - estimate_tokens(header), 1),
+    )
+
+    results = await asyncio.gather(
+        *(_extract_chunk(chain, chunk, header, semaphore) for chunk in chunks)
+    )
+
+    extracted_items: typing.Dict[str, typing.List[BotResponse]] = {}
+    unmatched_items: typing.List[BotResponse] = []
+    offset = 0
+
+    for chunk, chunk_items in zip(chunks, results):
+        chunk_keys = missing_keys[offset : offset + len(chunk)]
+        offset += len(chunk)
+
+        if all(
+            item.row is not None and 0 <= item.row < len(chunk_keys)
+            for item in chunk_items
+        ):
+            extracted_items.update({key: [] for key in chunk_keys})
+
+        for item in chunk_items:
+            response = BotResponse(**item.model_dump(exclude={"row"}))
+
+            if item.row is not None and 0 <= item.row < len(chunk_keys):
+                extracted_items.setdefault(chunk_keys[item.row], []).append(response)
+            else:
+                unmatched_items.append(response)
+
+    await cache_items(extracted_items)
+
+    items = [
+        item
+        for key in keys
+        for item in cached_items.get(key, extracted_items.get(key, []))
+    ]
+    items.extend(unmatched_items)
+    items.sort(key=lambda item: item.date)
+
+    return items
+
+
+async def categorize_titles(
+    titles: typing.List[str],
+    model: typing.Optional[BaseChatModel] = None,
+    stats: typing.Optional[ExtractionStats] = None,
+) -> typing.List[str]:
+    if not titles:
+        return []
+
+    model_name = get_model_name(model)
+    keys = [get_title_cache_key(title, model_name) for title in titles]
+
+    cached_categories = await get_cached_categories(keys)
+
+    if stats is not None:
+        stats.cache_lookups += len(keys)
+        stats.cache_hits += sum(key in cached_categories for key in keys)
+
+    missing_titles = {
+        key: title for key, title in zip(keys, titles) if key not in cached_categories
+    }
+    categorized: typing.Dict[str, str] = {}
+
+    if missing_titles and model is None:
+        try:
+            model = get_chat_model()
+        except ValueError as e:
+            logger.warning(
+                "Categorizing %d titles as others: %s", len(missing_titles), e
+            )
+
+    if missing_titles and model is not None:
+        missing_keys = list(missing_titles)
+        chain = build_category_chain(model)
+        semaphore = asyncio.Semaphore(LLM_CONCURRENCY)
+        chunks = chunk_rows(list(missing_titles.values()))
+
+        results = await asyncio.gather(
+            *(_categorize_chunk(chain, chunk, semaphore) for chunk in chunks)
+        )
+
+        offset = 0
+        for chunk, chunk_categories in zip(chunks, results):
+            chunk_keys = missing_keys[offset : offset + len(chunk)]
+            offset += len(chunk)
+
+            for index, category in chunk_categories.items():
+                if 0 <= index < len(chunk_keys):
+                    categorized[chunk_keys[index]] = category
+
+        await cache_categories(categorized)
+
+    return [cached_categories.get(key, categorized.get(key, "others")) for key in keys]
+
+
+def get_model_name(model: typing.Optional[BaseChatModel] = None) -> str:
+    if model is None and LLM_PROVIDER == "stub":
+        return "stub"
+
+    if model is None:
+        return f"models/{LLM_MODEL.removeprefix('models/')}"
+
+    return getattr(model, "model", None) or model._llm_type
+
+
+def get_row_cache_key(row: str, header_fingerprint: str, model_name: str) -> str:
+    normalized_row = " ".join(row.split())
+
+    return hashlib.sha256(
+        "\x1f".join(
+            [model_name, PROMPT_VERSION, header_fingerprint, normalized_row]
+        ).encode("utf-8")
+    ).hexdigest()
+
+
+def get_title_cache_key(title: str, model_name: str) -> str:
+    normalized_title = " ".join(title.lower().split())
+
+    return hashlib.sha256(
+        "\x1f".join(
+            [model_name, "category", CATEGORY_PROMPT_VERSION, normalized_title]
+        ).encode("utf-8")
+    ).hexdigest()
+
+
+async def get_cached_categories(keys: typing.List[str]) -> typing.Dict[str, str]:
+    if not keys:
+        return {}
+
+    collection = database.get_collection("llm_cache")
+    now = datetime.datetime.now(datetime.timezone.utc)
+
+    return {
+        document["_id"]: document["category"]
+        async for document in collection.find(
+            {"_id": {"$in": list(set(keys))}, "expires_at": {"$gt": now}},
+            projection={"category": 1},
+        )
+    }
+
+
+async def cache_categories(categorized: typing.Dict[str, str]) -> None:
+    if not categorized:
+        return
+
+    collection = database.get_collection("llm_cache")
+    expires_at = datetime.datetime.now(datetime.timezone.utc) + datetime.timedelta(
+        seconds=LLM_CACHE_TTL_SECONDS
+    )
+
+    await collection.bulk_write(
+        [
+            pymongo.UpdateOne(
+                {"_id": key},
+                {"$set": {"category": category, "expires_at": expires_at}},
+                upsert=True,
+            )
+            for key, category in categorized.items()
+        ],
+        ordered=False,
+    )
+
+
+async def get_cached_items(
+    keys: typing.List[str],
+) -> typing.Dict[str, typing.List[BotResponse]]:
+    if not keys:
+        return {}
+
+    collection = database.get_collection("llm_cache")
+    now = datetime.datetime.now(datetime.timezone.utc)
+
+    cached_items = {}
+    async for document in collection.find(
+        {"_id": {"$in": list(set(keys))}, "expires_at": {"$gt": now}},
+        projection={"items": 1},
+    ):
+        cached_items[document["_id"]] = [
+            BotResponse(**item) for item in document["items"]
+        ]
+
+    return cached_items
+
+
+async def cache_items(items: typing.Dict[str, typing.List[BotResponse]]) -> None:
+    if not items:
+        return
+
+    collection = database.get_collection("llm_cache")
+    expires_at = datetime.datetime.now(datetime.timezone.utc) + datetime.timedelta(
+        seconds=LLM_CACHE_TTL_SECONDS
+    )
+
+    await collection.bulk_write(
+        [
+            pymongo.UpdateOne(
+                {"_id": key},
+                {
+                    "$set": {
+                        "items": [item.model_dump() for item in key_items],
+                        "expires_at": expires_at,
+                    }
+                },
+                upsert=True,
+            )
+            for key, key_items in items.items()
+        ],
+        ordered=False,
+    )
+
+
+async def import_statement(
+    rows: typing.List[str],
+    header: str,
+    model: typing.Optional[BaseChatModel] = None,
+    stats: typing.Optional[ExtractionStats] = None,
+) -> typing.List[BotResponse]:
+    if stats is not None:
+        stats.rows += len(rows)
+
+    fingerprint = csv_parser.fingerprint_header(header)
+    mapping = await get_csv_profile(fingerprint)
+
+    if mapping is None:
+        model = model or get_chat_model()
+        mapping = await infer_column_mapping(
+            rows[: csv_parser.PROFILE_SAMPLE_ROWS], header, model
+        )
+
+        if mapping is None:
+            return await ask_bot(rows, header, model, stats)
+
+        await save_csv_profile(fingerprint, header, mapping)
+    else:
+        _run_in_background(record_csv_profile_use(fingerprint))
+
+    parsed_rows, failed_rows = csv_parser.parse_rows(rows, mapping)
+
+    if stats is not None:
+        stats.parsed_locally += len(parsed_rows)
+
+    uncategorized = [
+        index
+        for index, parsed_row in enumerate(parsed_rows)
+        if parsed_row.category not in categories
+    ]
+    guessed_categories = dict(
+        zip(
+            uncategorized,
+            await categorize_titles(
+                [parsed_rows[index].title for index in uncategorized], model, stats
+            ),
+        )
+    )
+
+    items = [
+        BotResponse(
+            title=parsed_row.title,
+            amount=parsed_row.amount,
+            currency=parsed_row.currency,
+            date=parsed_row.date,
+            category=guessed_categories.get(index, parsed_row.category),
+        )
+        for index, parsed_row in enumerate(parsed_rows)
+    ]
+
+    if failed_rows:
+        items.extend(
+            await ask_bot([rows[index] for index in failed_rows], header, model, stats)
+        )
+
+    items.sort(key=lambda item: item.date)
+
+    return items
+
+
+async def infer_column_mapping(
+    rows: typing.List[str],
+    header: str,
+    model: BaseChatModel,
+) -> typing.Optional[csv_parser.ColumnMapping]:
+    chain = build_mapping_chain(model)
+
+    try:
+        with metrics.observe_llm_call("column_mapping"):
+            response = await asyncio.wait_for(
+                chain.ainvoke({"file_content": "\n".join([header, *rows])}),
+                timeout=LLM_CHUNK_TIMEOUT_SECONDS,
+            )
+        mapping = csv_parser.ColumnMapping(**response)
+    except Exception as e:
+        logger.warning("Could not infer CSV column mapping: %r", e)
+        return None
+
+    if not csv_parser.validate_mapping(mapping, rows):
+        return None
+
+    return mapping
+
+
+async def get_csv_profile(
+    fingerprint: str,
+) -> typing.Optional[csv_parser.ColumnMapping]:
+    collection = database.get_collection("csv_profiles")
+
+    profile = await collection.find_one({"_id": fingerprint}, {"mapping": 1})
+
+    if profile is None:
+        return None
+
+    return csv_parser.ColumnMapping(**profile["mapping"])
+
+
+async def save_csv_profile(
+    fingerprint: str, header: str, mapping: csv_parser.ColumnMapping
+) -> None:
+    collection = database.get_collection("csv_profiles")
+    now = datetime.datetime.now(datetime.timezone.utc)
+
+    await collection.update_one(
+        {"_id": fingerprint},
+        {
+            "$set": {"header": header, "mapping": mapping.model_dump()},
+            "$setOnInsert": {"created_at": now},
+            "$max": {"last_used_at": now},
+            "$inc": {"uses": 1},
+        },
+        upsert=True,
+    )
+
+
+async def record_csv_profile_use(fingerprint: str) -> None:
+    await database.get_collection("csv_profiles").update_one(
+        {"_id": fingerprint},
+        {
+            "$inc": {"uses": 1},
+            "$max": {"last_used_at": datetime.datetime.now(datetime.timezone.utc)},
+        },
+    )
+
+
+async def _extract_chunk(
+    chain: Runnable,
+    rows: typing.List[str],
+    header: str,
+    semaphore: asyncio.Semaphore,
+) -> typing.List[BotRowResponse]:
+    file_content = "\n".join(
+        [header, *(f"[{index}] {row}" for index, row in enumerate(rows))]
+    )
+
+    return _parse_response(
+        await _invoke_chunk(chain, file_content, semaphore, "extraction")
+    )
+
+
+async def _categorize_chunk(
+    chain: Runnable,
+    titles: typing.List[str],
+    semaphore: asyncio.Semaphore,
+) -> typing.Dict[int, str]:
+    file_content = "\n".join(
+        f"[{index}] {' '.join(title.split())}" for index, title in enumerate(titles)
+    )
+
+    try:
+        response = await _invoke_chunk(chain, file_content, semaphore, "categories")
+    except Exception as e:
+        logger.warning("Could not categorize payment titles: %r", e)
+        return {}
+
+    if not response:
+        return {}
+
+    return {
+        item.row: (
+            item.category.lower() if item.category.lower() in categories else "others"
+        )
+        for item in CategoryResponseList(items=response["items"]).items
+    }
+
+
+async def _invoke_chunk(
+    chain: Runnable,
+    file_content: str,
+    semaphore: asyncio.Semaphore,
+    purpose: str,
+) -> typing.Any:
+    async with semaphore:
+        for attempt in range(LLM_CHUNK_RETRIES + 1):
+            try:
+                with metrics.observe_llm_call(purpose):
+                    return await asyncio.wait_for(
+                        chain.ainvoke({"file_content": file_content}),
+                        timeout=LLM_CHUNK_TIMEOUT_SECONDS,
+                    )
+
+            except Exception as e:
+                if attempt == LLM_CHUNK_RETRIES:
+                    raise
+
+                logger.warning(
+                    "LLM chunk failed (attempt %d/%d): %r",
+                    attempt + 1,
+                    LLM_CHUNK_RETRIES + 1,
+                    e,
+                )
+                await asyncio.sleep(LLM_RETRY_BACKOFF_SECONDS * 2**attempt)
+
+    return None
+
+
+def _run_in_background(coroutine: typing.Coroutine[typing.Any, typing.Any, None]):
+    task = asyncio.create_task(coroutine)
+    background_tasks.add(task)
+    task.add_done_callback(_finish_background_task)
+
+
+def _finish_background_task(task: asyncio.Task) -> None:
+    background_tasks.discard(task)
+
+    if not task.cancelled() and task.exception() is not None:
+        logger.warning("Background ingestion task failed: %r", task.exception())
+
+
+def _parse_response(response: typing.Any) -> typing.List[BotRowResponse]:
+    if not response:
+        return []
+
+    response_list = BotResponseList(items=response["items"])
+
+    for item in response_list.items:
+        if item.category.lower() in categories:
+            item.category = item.category.lower()
+        else:
+            item.category = "others"
+
+    return response_list.items
+
+
+def _parse_stub_row(row: str) -> typing.Optional[typing.Dict[str, typing.Any]]:
+    delimiter = ";" if row.count(";") >= row.count(",") else ","
+    fields = [field.strip().strip('"') for field in row.split(delimiter)]
+
+    title = None
+    amount = None
+    currency = "USD"
+    date = None
+
+    for field in fields:
+        if not field:
+            continue
+
+        if date is None:
+            try:
+                date = datetime.date.fromisoformat(field[:10]).isoformat()
+                continue
+            except ValueError:
+                pass
+
+        if field.upper() in currencies:
+            currency = field.upper()
+            continue
+
+        if amount is None:
+            try:
+                amount = float(field.replace(" ", "").replace(",", "."))
+                continue
+            except ValueError:
+                pass
+
+        if title is None:
+            title = field
+
+    if amount is None or date is None:
+        return None
+
+    return {
+        "title": title or "",
+        "amount": amount,
+        "currency": currency,
+        "date": date,
+        "category": _guess_stub_category(title or ""),
+    }
+
+
+def _guess_stub_category(title: str) -> str:
+    title = title.lower()
+
+    for category, keywords in STUB_CATEGORY_KEYWORDS.items():
+        if any(keyword in title for keyword in keywords):
+            return category
+
+    return "others"
@@ -1,12 +1,26 @@
+import asyncio
 import datetime
+import heapq
+import operator
+import os
 import re
 import typing
 
 import bson
+import bson.codec_options
 import helpers.database as database
+import numpy as np
 import pydantic
+import pymongo
+import pymongo.errors
 import pytz
-from dateutil.relativedelta import relativedelta
+from motor.motor_asyncio import AsyncIOMotorClientSession
+
+from . import occurrences, rollups, slow_queries, subscription_occurrences
+
+EXCLUDE_ID = frozenset({"id"})
+
+BULK_INSERT_BATCH_SIZE = int(os.getenv("BULK_INSERT_BATCH_SIZE", "500"))
 
 
 class FinanceItem(pydantic.BaseModel):
@@ -26,9 +40,8 @@ class FinanceItem(pydantic.BaseModel):
     )
 
     def model_dump(self, **kwargs):
-        exclude = kwargs.get("exclude", set())
-        exclude.add("id")
-        kwargs["exclude"] = exclude
+        exclude = kwargs.get("exclude")
+        kwargs["exclude"] = EXCLUDE_ID if exclude is None else {*exclude, "id"}
         return super().model_dump(**kwargs)
 
 
@@ -37,6 +50,21 @@ class SubscriptionItem(FinanceItem):
     end_date: typing.Optional[datetime.datetime] = None
     repeat_period: typing.Literal["day", "week", "month", "year"]
     repeat_value: int
+    version: int = 0
+    supersedes: typing.Optional[bson.ObjectId] = None
+    materialized_until: typing.Optional[datetime.datetime] = pydantic.Field(
+        default=None, exclude=True
+    )
+
+
+class VersionConflictError(Exception):
+    pass
+
+
+ROLLUP_PROJECTION = {"user": 1, "date": 1, "currency": 1, "category": 1, "amount": 1}
+
+Entry = typing.Tuple[datetime.datetime, str, typing.Any]
+MaterializedDates = typing.Dict[bson.ObjectId, typing.List[datetime.datetime]]
 
 
 class FinanceItemWrapper:
@@ -50,30 +78,24 @@ class FinanceItemWrapper:
         start_date: typing.Union[str, datetime.datetime],
         end_date: typing.Union[str, datetime.datetime],
         user_id: bson.ObjectId,
+        after: typing.Optional[typing.Tuple[datetime.datetime, bson.ObjectId]] = None,
     ) -> typing.AsyncGenerator[typing.Union[FinanceItem, SubscriptionItem], None]:
-        start_date = self._parse_and_localize_date(start_date)
-        end_date = self._parse_and_localize_date(end_date)
-
-        query = {
-            "$gte": self._get_start_of_day(start_date),
-            "$lte": self._get_end_of_day(end_date),
-        }
-
-        cursor = self.finances_collection.find(
-            {
-                "date": query,
-                "user": user_id,
-            }
-        ).sort("date", 1)
-
-        async for doc in cursor:
-            doc["date"] = localize_datetime(doc["date"], self.timezone)
-            yield FinanceItem(**doc)
+        async for _, _, item in self._merge_entries(
+            start_date, end_date, user_id, after, lean=False
+        ):
+            yield item
 
-        async for subscription in self.list_subscription_items(
-            start_date, end_date, user_id
+    async def list_item_documents(
+        self,
+        start_date: typing.Union[str, datetime.datetime],
+        end_date: typing.Union[str, datetime.datetime],
+        user_id: bson.ObjectId,
+        after: typing.Optional[typing.Tuple[datetime.datetime, bson.ObjectId]] = None,
+    ) -> typing.AsyncGenerator[typing.Dict[str, typing.Any], None]:
+        async for _, _, doc in self._merge_entries(
+            start_date, end_date, user_id, after, lean=True
         ):
-            yield subscription
+            yield doc
 
     async def list_subscription_items(
         self,
@@ -81,41 +103,131 @@ class FinanceItemWrapper:
         end_date: typing.Union[str, datetime.datetime],
         user_id: bson.ObjectId,
     ) -> typing.AsyncGenerator[SubscriptionItem, None]:
-        start_date = self._parse_and_localize_date(start_date)
-        end_date = self._parse_and_localize_date(end_date)
-
-        doc = await self.subscriptions_collection.find_one(
-            {
-                "start_date": {"$lte": end_date},
-                "user": user_id,
-            }
+        start_date = self._get_start_of_day(self._parse_and_localize_date(start_date))
+        end_date = self._get_end_of_day(self._parse_and_localize_date(end_date))
+
+        subscription_docs, materialized_dates = await asyncio.gather(
+            slow_queries.find_all(
+                self.subscriptions_collection,
+                self._get_overlapping_subscriptions_query(
+                    start_date, end_date, user_id
+                ),
+            ),
+            self._get_materialized_dates(start_date, end_date, user_id),
         )
 
-        if doc is None:
-            return
+        for _, _, subscription_item in self._merge_subscription_entries(
+            subscription_docs, start_date, end_date, False, materialized_dates
+        ):
+            yield subscription_item
 
-        subscription_item = SubscriptionItem(**doc)
-        subscription_item.start_date = self._parse_and_localize_date(doc["start_date"])
+    async def summarize_items(
+        self,
+        start_date: typing.Union[str, datetime.datetime],
+        end_date: typing.Union[str, datetime.datetime],
+        user_id: bson.ObjectId,
+    ) -> typing.Dict[str, typing.Dict[str, float]]:
+        start_date = self._get_start_of_day(self._parse_and_localize_date(start_date))
+        end_date = self._get_end_of_day(self._parse_and_localize_date(end_date))
 
-        if subscription_item.end_date is not None:
-            subscription_item.end_date = self._parse_and_localize_date(
-                subscription_item.end_date
+        if self.timezone == rollups.ROLLUP_TIMEZONE:
+            summary = await rollups.summarize(
+                user_id, start_date.date().isoformat(), end_date.date().isoformat()
             )
+        else:
+            summary = await self._summarize_finance_items(start_date, end_date, user_id)
+
+        subscription_docs, materialized_dates = await asyncio.gather(
+            self.subscriptions_collection.find(
+                self._get_overlapping_subscriptions_query(
+                    start_date, end_date, user_id
+                ),
+                {
+                    "amount": 1,
+                    "currency": 1,
+                    "start_date": 1,
+                    "end_date": 1,
+                    "repeat_period": 1,
+                    "repeat_value": 1,
+                    "materialized_until": 1,
+                },
+            ).to_list(length=None),
+            self._get_materialized_dates(start_date, end_date, user_id),
+        )
 
-        current_doc_date = subscription_item.start_date
-        subscription_end_date = subscription_item.end_date or end_date
-
-        while current_doc_date < subscription_end_date:
-            subscription_item = SubscriptionItem(**doc)
-            subscription_item.date = current_doc_date
-            yield subscription_item
-
-            current_doc_date = self._advance_date_by_period(
-                current_doc_date,
-                subscription_item.repeat_period,
-                subscription_item.repeat_value,
+        for doc in subscription_docs:
+            amount = round(doc["amount"], 2)
+            currency = doc["currency"]
+
+            if materialized_dates is not None and (
+                subscription_occurrences.is_materialized(doc, end_date)
+            ):
+                string_dates = [
+                    date.date().isoformat()
+                    for date in self._iter_subscription_dates(
+                        doc, start_date, end_date, materialized_dates
+                    )
+                ]
+            else:
+                string_dates = [
+                    string_date
+                    for batch in self._iter_subscription_date_batches(
+                        doc, start_date, end_date
+                    )
+                    for string_date in np.datetime_as_string(batch, unit="D")
+                ]
+
+            for string_date in string_dates:
+                summary.setdefault(string_date, {})
+                summary[string_date][currency] = (
+                    summary[string_date].get(currency, 0) + amount
+                )
+
+        return summary
+
+    async def _summarize_finance_items(
+        self,
+        start_date: datetime.datetime,
+        end_date: datetime.datetime,
+        user_id: bson.ObjectId,
+    ) -> typing.Dict[str, typing.Dict[str, float]]:
+        pipeline = [
+            {
+                "$match": {
+                    "user": user_id,
+                    "date": {"$gte": start_date, "$lte": end_date},
+                }
+            },
+            {"$project": {"_id": 0, "date": 1, "amount": 1, "currency": 1}},
+            {
+                "$group": {
+                    "_id": {
+                        "date": {
+                            "$dateToString": {
+                                "format": "%Y-%m-%d",
+                                "date": "$date",
+                                "timezone": self.timezone,
+                            }
+                        },
+                        "currency": "$currency",
+                    },
+                    "amount": {"$sum": {"$round": ["$amount", 2]}},
+                }
+            },
+        ]
+
+        summary: typing.Dict[str, typing.Dict[str, float]] = {}
+        async for doc in slow_queries.aggregate(self.finances_collection, pipeline):
+            string_date = doc["_id"]["date"]
+            currency = doc["_id"]["currency"]
+
+            summary.setdefault(string_date, {})
+            summary[string_date][currency] = (
+                summary[string_date].get(currency, 0) + doc["amount"]
             )
 
+        return summary
+
     async def get_finance_items_from_subscription(
         self,
         item_id: typing.Optional[typing.Union[str, bson.ObjectId]] = None,
@@ -132,53 +244,155 @@ class FinanceItemWrapper:
         if subscription_item is None:
             return []
 
-        start_date = subscription_item.start_date
-        end_date = subscription_item.end_date or self._parse_and_localize_date(
-            datetime.datetime.now()
-        )
+        end_date = self._parse_and_localize_date(datetime.datetime.now())
+        if subscription_item.end_date is not None:
+            end_date = self._parse_and_localize_date(subscription_item.end_date)
 
-        result = []
-        current_date = start_date
+        template_item = FinanceItem(
+            **subscription_item.model_dump(), _id=subscription_item.id
+        )
 
-        while current_date <= end_date:
-            finance_item = FinanceItem(
-                **subscription_item.model_dump(), _id=subscription_item.id
+        if self.timezone == subscription_occurrences.OCCURRENCE_TIMEZONE and (
+            subscription_occurrences.is_materialized(
+                {
+                    "materialized_until": subscription_item.materialized_until,
+                    "end_date": subscription_item.end_date,
+                },
+                end_date,
             )
-            finance_item.date = current_date
-            result.append(finance_item)
-
-            current_date = self._advance_date_by_period(
-                current_date,
+        ):
+            local_tz = pytz.timezone(self.timezone)
+
+            return [
+                template_item.model_copy(update={"date": date.astimezone(local_tz)})
+                for date in await subscription_occurrences.list_subscription_dates(
+                    subscription_item.id, end_date
+                )
+            ]
+
+        return [
+            template_item.model_copy(update={"date": date})
+            for date in occurrences.iter_occurrences(
+                subscription_item.start_date,
                 subscription_item.repeat_period,
                 subscription_item.repeat_value,
+                subscription_item.start_date,
+                end_date,
+                timezone=self.timezone,
             )
-
-        return result
+        ]
 
     async def get_item(
         self,
         item_id: typing.Union[str, bson.ObjectId],
+        user_id: typing.Optional[bson.ObjectId] = None,
     ) -> typing.Optional[typing.Union[FinanceItem, SubscriptionItem]]:
-        doc = await self.finances_collection.find_one({"_id": bson.ObjectId(item_id)})
+        doc = await self.find_item(item_id, user_id)
+
+        if doc is None:
+            return None
+
+        if doc.get("is_subscription"):
+            return SubscriptionItem(**doc)
+
+        return FinanceItem(**doc)
+
+    async def get_item_document(
+        self,
+        item_id: typing.Union[str, bson.ObjectId],
+        user_id: typing.Optional[bson.ObjectId] = None,
+    ) -> typing.Optional[typing.Dict[str, typing.Any]]:
+        doc = await self.find_item(item_id, user_id, lean=True)
+
+        if doc is None:
+            return None
+
+        return to_lean_document(doc)
 
-        if doc is not None:
-            return FinanceItem(**doc)
+    async def find_item(
+        self,
+        item_id: typing.Union[str, bson.ObjectId],
+        user_id: typing.Optional[bson.ObjectId] = None,
+        projection: typing.Optional[typing.Dict[str, typing.Any]] = None,
+        lean: bool = False,
+    ) -> typing.Optional[typing.Dict[str, typing.Any]]:
+        if not bson.ObjectId.is_valid(item_id):
+            return None
+
+        query: typing.Dict[str, typing.Any] = {"_id": bson.ObjectId(item_id)}
+        if user_id is not None:
+            query["user"] = user_id
+
+        stages: typing.List[typing.Dict[str, typing.Any]] = [{"$match": query}]
+        if projection is not None:
+            stages.append({"$project": {**projection, "is_subscription": 1}})
+
+        finances_collection = self.finances_collection
+        if lean:
+            finances_collection = finances_collection.with_options(
+                codec_options=self._get_codec_options()
+            )
 
-        subscription_doc = await self.subscriptions_collection.find_one(
-            {"_id": bson.ObjectId(item_id)}
+        docs = await slow_queries.aggregate_all(
+            finances_collection,
+            [
+                *stages,
+                {
+                    "$unionWith": {
+                        "coll": self.subscriptions_collection.name,
+                        "pipeline": stages,
+                    }
+                },
+                {"$limit": 1},
+            ],
         )
 
-        if subscription_doc is not None:
-            return SubscriptionItem(**subscription_doc)
+        return docs[0] if docs else None
 
     async def create_item(self, item: FinanceItem) -> FinanceItem:
         item.date = localize_datetime(item.date, self.timezone)
         new_item = FinanceItem(**item.model_dump())
 
-        response = await self.finances_collection.insert_one(new_item.model_dump())
+        document = new_item.model_dump()
+        response = await self.finances_collection.insert_one(document)
         new_item.id = bson.ObjectId(response.inserted_id)
+
+        await rollups.apply_changes(added=[document])
         return new_item
 
+    async def create_items(
+        self, items: typing.List[FinanceItem], batch_size: int = BULK_INSERT_BATCH_SIZE
+    ) -> typing.List[typing.Tuple[bson.ObjectId, typing.Optional[str]]]:
+        documents = []
+        for item in items:
+            item.date = localize_datetime(item.date, self.timezone)
+            item.id = bson.ObjectId()
+            documents.append({"_id": item.id, **item.model_dump()})
+
+        results: typing.List[typing.Tuple[bson.ObjectId, typing.Optional[str]]] = [
+            (document["_id"], None) for document in documents
+        ]
+
+        for batch_start in range(0, len(documents), batch_size):
+            try:
+                await self.finances_collection.insert_many(
+                    documents[batch_start : batch_start + batch_size], ordered=False
+                )
+            except pymongo.errors.BulkWriteError as e:
+                for error in e.details["writeErrors"]:
+                    index = batch_start + error["index"]
+                    results[index] = (results[index][0], error["errmsg"])
+
+        await rollups.apply_changes(
+            added=[
+                document
+                for document, (_, error) in zip(documents, results)
+                if error is None
+            ]
+        )
+
+        return results
+
     async def create_subscription_item(
         self,
         item: FinanceItem,
@@ -195,75 +409,223 @@ class FinanceItemWrapper:
         }
         new_item = SubscriptionItem(**item.model_dump(), **subscription_data)
 
-        response = await self.subscriptions_collection.insert_one(new_item.model_dump())
+        document = new_item.model_dump()
+        response = await self.subscriptions_collection.insert_one(document)
         new_item.id = bson.ObjectId(response.inserted_id)
+
+        new_item.materialized_until = await subscription_occurrences.materialize(
+            {**document, "_id": new_item.id}
+        )
         return new_item
 
     async def update_item(
         self,
-        database_item: FinanceItem,
+        item_id: typing.Union[str, bson.ObjectId],
+        user_id: bson.ObjectId,
         request_item: FinanceItem,
     ) -> bool:
-        response = await self.finances_collection.update_one(
-            {"_id": bson.ObjectId(database_item.id)},
-            {"$set": request_item.model_dump()},
+        document = request_item.model_dump()
+        document["date"] = localize_datetime(document["date"], self.timezone)
+
+        previous_document = await self.finances_collection.find_one_and_update(
+            {"_id": bson.ObjectId(item_id), "user": user_id},
+            {"$set": document},
+            projection=ROLLUP_PROJECTION,
         )
-        return response.modified_count == 1
+
+        if previous_document is None:
+            return False
+
+        await rollups.apply_changes(added=[document], removed=[previous_document])
+        return True
 
     async def update_subscription_item(
         self,
-        database_item: SubscriptionItem,
+        item_id: typing.Union[str, bson.ObjectId],
+        user_id: bson.ObjectId,
         request_item: SubscriptionItem,
-    ) -> bool:
-        database_item.end_date = localize_datetime(
+        expected_version: typing.Optional[int] = None,
+    ) -> typing.Optional[SubscriptionItem]:
+        self._validate_subscription_params(
+            request_item.repeat_period, str(request_item.repeat_value)
+        )
+
+        item_id = bson.ObjectId(item_id)
+        start_date = localize_datetime(request_item.date, self.timezone)
+        end_date = localize_datetime(
             request_item.date - datetime.timedelta(days=1), self.timezone
         )
-        response = await self.subscriptions_collection.update_one(
-            {"_id": bson.ObjectId(database_item.id)},
-            {"$set": database_item.model_dump()},
+
+        new_item = request_item.model_copy(
+            update={
+                "id": bson.ObjectId(),
+                "date": start_date,
+                "start_date": start_date,
+                "user": user_id,
+                "is_subscription": True,
+                "version": 0,
+                "supersedes": item_id,
+                "materialized_until": None,
+            }
         )
+        document = {"_id": new_item.id, **new_item.model_dump()}
+
+        query: typing.Dict[str, typing.Any] = {
+            "_id": item_id,
+            "user": user_id,
+            "superseded_by": None,
+        }
+        if expected_version is not None:
+            query["version"] = (
+                expected_version if expected_version else {"$in": [0, None]}
+            )
+
+        update = {
+            "$set": {"end_date": end_date, "superseded_by": new_item.id},
+            "$inc": {"version": 1},
+        }
 
         try:
-            new_item = await self.create_subscription_item(
-                request_item, request_item.repeat_period, str(request_item.repeat_value)
+            if database.supports_transactions():
+                async with await database.mongodb_client.start_session() as session:
+                    is_superseded = await session.with_transaction(
+                        lambda session: self._supersede_subscription(
+                            query, update, document, session
+                        )
+                    )
+            else:
+                is_superseded = await self._supersede_subscription(
+                    query, update, document
+                )
+        except pymongo.errors.DuplicateKeyError:
+            raise VersionConflictError("Subscription was modified concurrently")
+
+        if not is_superseded:
+            if expected_version is not None and (
+                await self.subscriptions_collection.find_one(
+                    {"_id": item_id, "user": user_id}, {"_id": 1}
+                )
+                is not None
+            ):
+                raise VersionConflictError("Subscription was modified concurrently")
+
+            return None
+
+        await subscription_occurrences.invalidate_after(item_id, end_date)
+        new_item.materialized_until = await subscription_occurrences.materialize(
+            document
+        )
+
+        return new_item
+
+    async def _supersede_subscription(
+        self,
+        query: typing.Dict[str, typing.Any],
+        update: typing.Dict[str, typing.Any],
+        document: typing.Dict[str, typing.Any],
+        session: typing.Optional[AsyncIOMotorClientSession] = None,
+    ) -> bool:
+        await self.subscriptions_collection.insert_one(document, session=session)
+
+        try:
+            response = await self.subscriptions_collection.update_one(
+                query, update, session=session
+            )
+        except pymongo.errors.PyMongoError:
+            if session is None:
+                await self.subscriptions_collection.delete_one({"_id": document["_id"]})
+            raise
+
+        if response.matched_count == 0:
+            await self.subscriptions_collection.delete_one(
+                {"_id": document["_id"]}, session=session
             )
-            return response.modified_count == 1 and new_item is not None
-        except ValueError:
             return False
 
+        return True
+
     async def delete_item(
         self,
         item_id: typing.Optional[typing.Union[str, bson.ObjectId]] = None,
         item: typing.Optional[FinanceItem] = None,
+        user_id: typing.Optional[bson.ObjectId] = None,
     ) -> bool:
-        item_id = self._get_item_id(item_id, item)
-        response = await self.finances_collection.delete_one({"_id": item_id})
-        return response.deleted_count == 1
+        query: typing.Dict[str, typing.Any] = {"_id": self._get_item_id(item_id, item)}
+        if user_id is not None:
+            query["user"] = user_id
+
+        deleted_document = await self.finances_collection.find_one_and_delete(
+            query, projection=ROLLUP_PROJECTION
+        )
+
+        if deleted_document is None:
+            return False
+
+        await rollups.apply_changes(removed=[deleted_document])
+        return True
 
     async def delete_subscription_item(
         self,
         item_id: typing.Optional[typing.Union[str, bson.ObjectId]] = None,
         item: typing.Optional[SubscriptionItem] = None,
+        user_id: typing.Optional[bson.ObjectId] = None,
     ) -> bool:
-        item_id = self._get_item_id(item_id, item)
-        response = await self.subscriptions_collection.delete_one({"_id": item_id})
-        return response.deleted_count == 1
+        query: typing.Dict[str, typing.Any] = {"_id": self._get_item_id(item_id, item)}
+        if user_id is not None:
+            query["user"] = user_id
+
+        deleted_document = await self.subscriptions_collection.find_one_and_delete(
+            query, projection={"_id": 1}
+        )
+
+        if deleted_document is None:
+            return False
+
+        await subscription_occurrences.invalidate_after(deleted_document["_id"])
+        return True
 
     async def pause_subscription_item(
-        self, item: SubscriptionItem, date: typing.Union[str, datetime.datetime]
+        self,
+        item_id: typing.Union[str, bson.ObjectId],
+        user_id: bson.ObjectId,
+        date: typing.Union[str, datetime.datetime],
     ) -> typing.Optional[SubscriptionItem]:
         if isinstance(date, str):
             date = datetime.datetime.fromisoformat(date)
         date = localize_datetime(date, self.timezone)
 
-        item.end_date = date
-
-        response = await self.subscriptions_collection.update_one(
-            {"_id": bson.ObjectId(item.id)},
-            {"$set": {"end_date": date}},
+        doc = await self.subscriptions_collection.find_one_and_update(
+            {"_id": bson.ObjectId(item_id), "user": user_id, "superseded_by": None},
+            [
+                {
+                    "$set": {
+                        "end_date": date,
+                        "version": {"$add": [{"$ifNull": ["$version", 0]}, 1]},
+                        "materialized_until": {
+                            "$cond": [
+                                {
+                                    "$eq": [
+                                        {"$ifNull": ["$materialized_until", None]},
+                                        None,
+                                    ]
+                                },
+                                None,
+                                {"$min": ["$materialized_until", "$end_date", date]},
+                            ]
+                        },
+                    }
+                }
+            ],
+            return_document=pymongo.ReturnDocument.AFTER,
         )
 
-        return item if response.modified_count == 1 else None
+        if doc is None:
+            return None
+
+        await subscription_occurrences.invalidate_after(doc["_id"], date)
+        doc["materialized_until"] = await subscription_occurrences.materialize(doc)
+
+        return SubscriptionItem(**doc)
 
     def _validate_subscription_params(
         self, repeat_period: typing.Optional[str], repeat_value: typing.Optional[str]
@@ -290,6 +652,228 @@ class FinanceItemWrapper:
             return bson.ObjectId(item_id) if isinstance(item_id, str) else item_id
         raise ValueError("Either item_id or item must be provided")
 
+    def _get_overlapping_subscriptions_query(
+        self,
+        start_date: datetime.datetime,
+        end_date: datetime.datetime,
+        user_id: bson.ObjectId,
+    ) -> typing.Dict[str, typing.Any]:
+        return {
+            "user": user_id,
+            "start_date": {"$lte": end_date},
+            "$or": [
+                {"end_date": None},
+                {"end_date": {"$gte": start_date}},
+            ],
+        }
+
+    async def _merge_entries(
+        self,
+        start_date: typing.Union[str, datetime.datetime],
+        end_date: typing.Union[str, datetime.datetime],
+        user_id: bson.ObjectId,
+        after: typing.Optional[typing.Tuple[datetime.datetime, bson.ObjectId]],
+        lean: bool,
+    ) -> typing.AsyncGenerator[Entry, None]:
+        start_date = self._get_start_of_day(self._parse_and_localize_date(start_date))
+        end_date = self._get_end_of_day(self._parse_and_localize_date(end_date))
+
+        query: typing.Dict[str, typing.Any] = {
+            "date": {"$gte": start_date, "$lte": end_date},
+            "user": user_id,
+        }
+
+        if after is not None:
+            after_date, after_id = after
+            after_date = self._parse_and_localize_date(after_date)
+            start_date = max(start_date, after_date)
+
+            query["$or"] = [
+                {"date": {"$gt": after_date}},
+                {"date": after_date, "_id": {"$gt": after_id}},
+            ]
+
+        finances_collection = self.finances_collection
+        subscriptions_collection = self.subscriptions_collection
+
+        if lean:
+            codec_options = self._get_codec_options()
+            finances_collection = finances_collection.with_options(
+                codec_options=codec_options
+            )
+            subscriptions_collection = subscriptions_collection.with_options(
+                codec_options=codec_options
+            )
+
+        cursor = slow_queries.find(
+            finances_collection,
+            query,
+            [("date", pymongo.ASCENDING), ("_id", pymongo.ASCENDING)],
+        )
+
+        first_doc, subscription_docs, materialized_dates = await asyncio.gather(
+            anext(cursor, None),
+            slow_queries.find_all(
+                subscriptions_collection,
+                self._get_overlapping_subscriptions_query(
+                    start_date, end_date, user_id
+                ),
+            ),
+            self._get_materialized_dates(start_date, end_date, user_id),
+        )
+
+        subscription_entries = self._merge_subscription_entries(
+            subscription_docs, start_date, end_date, lean, materialized_dates
+        )
+        next_subscription_entry = next(subscription_entries, None)
+
+        if after is not None:
+            after_key = (after_date, str(after_id))
+            while (
+                next_subscription_entry is not None
+                and next_subscription_entry[:2] <= after_key
+            ):
+                next_subscription_entry = next(subscription_entries, None)
+
+        if first_doc is None:
+            docs = cursor
+        else:
+            docs = _chain_cursor(first_doc, cursor)
+
+        async for doc in docs:
+            if lean:
+                finance_entry = (doc["date"], str(doc["_id"]), to_lean_document(doc))
+            else:
+                doc["date"] = localize_datetime(doc["date"], self.timezone)
+                finance_entry = (doc["date"], str(doc["_id"]), FinanceItem(**doc))
+
+            while (
+                next_subscription_entry is not None
+                and next_subscription_entry[:2] < finance_entry[:2]
+            ):
+                yield next_subscription_entry
+                next_subscription_entry = next(subscription_entries, None)
+
+            yield finance_entry
+
+        while next_subscription_entry is not None:
+            yield next_subscription_entry
+            next_subscription_entry = next(subscription_entries, None)
+
+    def _merge_subscription_entries(
+        self,
+        docs: typing.List[typing.Dict[str, typing.Any]],
+        start_date: datetime.datetime,
+        end_date: datetime.datetime,
+        lean: bool,
+        materialized_dates: typing.Optional[MaterializedDates] = None,
+    ) -> typing.Iterator[Entry]:
+        return heapq.merge(
+            *(
+                self._iter_subscription_entries(
+                    doc, start_date, end_date, lean, materialized_dates
+                )
+                for doc in docs
+            ),
+            key=operator.itemgetter(0, 1),
+        )
+
+    def _iter_subscription_entries(
+        self,
+        doc: typing.Dict[str, typing.Any],
+        start_date: datetime.datetime,
+        end_date: datetime.datetime,
+        lean: bool,
+        materialized_dates: typing.Optional[MaterializedDates] = None,
+    ) -> typing.Iterator[Entry]:
+        item_id = str(doc["_id"])
+
+        if lean:
+            lean_doc = to_lean_document(doc)
+
+            for date in self._iter_subscription_dates(
+                doc, start_date, end_date, materialized_dates
+            ):
+                yield date, item_id, {**lean_doc, "date": date}
+            return
+
+        subscription_item = SubscriptionItem(**doc)
+        subscription_item.start_date = self._parse_and_localize_date(doc["start_date"])
+
+        if subscription_item.end_date is not None:
+            subscription_item.end_date = self._parse_and_localize_date(
+                subscription_item.end_date
+            )
+
+        for date in self._iter_subscription_dates(
+            doc, start_date, end_date, materialized_dates
+        ):
+            yield date, item_id, subscription_item.model_copy(update={"date": date})
+
+    async def _get_materialized_dates(
+        self,
+        start_date: datetime.datetime,
+        end_date: datetime.datetime,
+        user_id: bson.ObjectId,
+    ) -> typing.Optional[MaterializedDates]:
+        if self.timezone != subscription_occurrences.OCCURRENCE_TIMEZONE:
+            return None
+
+        return await subscription_occurrences.list_dates(user_id, start_date, end_date)
+
+    def _iter_subscription_dates(
+        self,
+        doc: typing.Dict[str, typing.Any],
+        start_date: datetime.datetime,
+        end_date: datetime.datetime,
+        materialized_dates: typing.Optional[MaterializedDates] = None,
+    ) -> typing.Iterator[datetime.datetime]:
+        if materialized_dates is not None and (
+            subscription_occurrences.is_materialized(doc, end_date)
+        ):
+            local_tz = pytz.timezone(self.timezone)
+
+            return (
+                date.astimezone(local_tz)
+                for date in materialized_dates.get(doc["_id"], [])
+                if start_date <= date <= end_date
+            )
+
+        return occurrences.iter_occurrences(
+            **self._get_subscription_schedule(doc),
+            window_start=start_date,
+            window_end=end_date,
+        )
+
+    def _iter_subscription_date_batches(
+        self,
+        doc: typing.Dict[str, typing.Any],
+        start_date: datetime.datetime,
+        end_date: datetime.datetime,
+    ) -> typing.Iterator[np.ndarray]:
+        return occurrences.iter_occurrence_batches(
+            **self._get_subscription_schedule(doc),
+            window_start=start_date,
+            window_end=end_date,
+        )
+
+    def _get_subscription_schedule(
+        self, doc: typing.Dict[str, typing.Any]
+    ) -> typing.Dict[str, typing.Any]:
+        end_date = doc.get("end_date")
+
+        return {
+            "start_date": self._parse_and_localize_date(doc["start_date"]),
+            "repeat_period": doc["repeat_period"],
+            "repeat_value": doc["repeat_value"],
+            "end_date": (
+                self._parse_and_localize_date(end_date)
+                if end_date is not None
+                else None
+            ),
+            "timezone": self.timezone,
+        }
+
     def _parse_and_localize_date(
         self, date: typing.Union[str, datetime.datetime]
     ) -> datetime.datetime:
@@ -297,19 +881,10 @@ class FinanceItemWrapper:
             date = datetime.datetime.fromisoformat(date)
         return localize_datetime(date, self.timezone)
 
-    def _advance_date_by_period(
-        self, date: datetime.datetime, period: str, value: int
-    ) -> datetime.datetime:
-        match period:
-            case "day":
-                return date + datetime.timedelta(days=value)
-            case "week":
-                return date + datetime.timedelta(weeks=value)
-            case "month":
-                return date + relativedelta(months=value)
-            case "year":
-                return date + relativedelta(years=value)
-        return date
+    def _get_codec_options(self) -> bson.codec_options.CodecOptions:
+        return bson.codec_options.CodecOptions(
+            tz_aware=True, tzinfo=pytz.timezone(self.timezone)
+        )
 
     @staticmethod
     def _get_start_of_day(date: datetime.datetime) -> datetime.datetime:
@@ -330,6 +905,51 @@ def localize_datetime(
     return dt.astimezone(pytz.timezone(timezone))
 
 
+async def _chain_cursor(
+    first_doc: typing.Dict[str, typing.Any],
+    cursor: typing.AsyncIterator[typing.Dict[str, typing.Any]],
+) -> typing.AsyncGenerator[typing.Dict[str, typing.Any], None]:
+    yield first_doc
+
+    async for doc in cursor:
+        yield doc
+
+
+def _get_public_fields(
+    model: typing.Type[pydantic.BaseModel],
+) -> typing.Tuple[str, ...]:
+    return tuple(
+        field.alias or name
+        for name, field in model.model_fields.items()
+        if not field.exclude
+    )
+
+
+PUBLIC_FIELDS = {
+    False: _get_public_fields(FinanceItem),
+    True: _get_public_fields(SubscriptionItem),
+}
+
+
+def to_lean_document(doc: typing.Dict[str, typing.Any]) -> typing.Dict[str, typing.Any]:
+    lean_doc = {}
+
+    for key in PUBLIC_FIELDS[bool(doc.get("is_subscription"))]:
+        if key not in doc:
+            continue
+
+        value = doc[key]
+        if key == "_id":
+            key = "id"
+
+        if isinstance(value, bson.ObjectId):
+            value = str(value)
+
+        lean_doc[key] = value
+
+    return lean_doc
+
+
 def get_finance_wrapper(timezone: str = "UTC") -> FinanceItemWrapper:
     finance_wrapper = FinanceItemWrapper(timezone)
 
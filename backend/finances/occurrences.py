@@ -0,0 +1,137 @@
+import datetime
+import typing
+
+import numpy as np
+import pytz
+
+BATCH_SIZE = 256
+
+DAY = np.timedelta64(1, "D")
+MICROSECONDS_PER_DAY = 24 * 60 * 60 * 1_000_000
+
+
+def iter_occurrence_batches(
+    start_date: datetime.datetime,
+    repeat_period: str,
+    repeat_value: int,
+    window_start: datetime.datetime,
+    window_end: datetime.datetime,
+    end_date: typing.Optional[datetime.datetime] = None,
+    timezone: str = "UTC",
+    batch_size: int = BATCH_SIZE,
+) -> typing.Iterator[np.ndarray]:
+    local_tz = pytz.timezone(timezone)
+
+    start = _to_wall_time(start_date, local_tz)
+    window_start_wall = _to_wall_time(window_start, local_tz)
+    limit = _to_wall_time(window_end, local_tz)
+    if end_date is not None:
+        limit = min(limit, _to_wall_time(end_date, local_tz))
+
+    if limit < start or limit < window_start_wall:
+        return
+
+    if repeat_value <= 0:
+        if start >= window_start_wall:
+            yield np.array([start], dtype="datetime64[us]")
+        return
+
+    match repeat_period:
+        case "day" | "week":
+            yield from _iter_fixed_step_batches(
+                start,
+                repeat_value * (7 if repeat_period == "week" else 1),
+                window_start_wall,
+                limit,
+                batch_size,
+            )
+        case "month" | "year":
+            yield from _iter_month_step_batches(
+                start,
+                repeat_value * (12 if repeat_period == "year" else 1),
+                window_start_wall,
+                limit,
+                batch_size,
+            )
+
+
+def iter_occurrences(
+    start_date: datetime.datetime,
+    repeat_period: str,
+    repeat_value: int,
+    window_start: datetime.datetime,
+    window_end: datetime.datetime,
+    end_date: typing.Optional[datetime.datetime] = None,
+    timezone: str = "UTC",
+    batch_size: int = BATCH_SIZE,
+) -> typing.Iterator[datetime.datetime]:
+    local_tz = pytz.timezone(timezone)
+
+    for batch in iter_occurrence_batches(
+        start_date,
+        repeat_period,
+        repeat_value,
+        window_start,
+        window_end,
+        end_date,
+        timezone,
+        batch_size,
+    ):
+        for date in batch.astype(datetime.datetime):
+            yield local_tz.localize(date)
+
+
+def _iter_fixed_step_batches(
+    start: np.datetime64,
+    step_days: int,
+    window_start: np.datetime64,
+    limit: np.datetime64,
+    batch_size: int,
+) -> typing.Iterator[np.ndarray]:
+    step = np.timedelta64(step_days * MICROSECONDS_PER_DAY, "us")
+
+    first_index = max(0, int(-(-(window_start - start) // step)))
+    last_index = int((limit - start) // step)
+
+    for batch_start in range(first_index, last_index + 1, batch_size):
+        indexes = np.arange(batch_start, min(batch_start + batch_size, last_index + 1))
+        yield start + indexes * step
+
+
+def _iter_month_step_batches(
+    start: np.datetime64,
+    step_months: int,
+    window_start: np.datetime64,
+    limit: np.datetime64,
+    batch_size: int,
+) -> typing.Iterator[np.ndarray]:
+    start_month = start.astype("datetime64[M]")
+    start_day = (
+        start.astype("datetime64[D]") - start_month.astype("datetime64[D]")
+    ) // DAY
+    time_of_day = start - start.astype("datetime64[D]")
+
+    def month_offset(date: np.datetime64) -> int:
+        return int((date.astype("datetime64[M]") - start_month).astype(int))
+
+    first_index = max(0, -(-month_offset(window_start) // step_months))
+    last_index = month_offset(limit) // step_months
+
+    for batch_start in range(first_index, last_index + 1, batch_size):
+        indexes = np.arange(batch_start, min(batch_start + batch_size, last_index + 1))
+
+        months = start_month + indexes * step_months
+        month_days = (months + 1).astype("datetime64[D]") - months.astype(
+            "datetime64[D]"
+        )
+        days = np.minimum(start_day, month_days // DAY - 1)
+
+        dates = months.astype("datetime64[D]") + days * DAY + time_of_day
+        yield dates[(dates >= window_start) & (dates <= limit)]
+
+
+def _to_wall_time(date: datetime.datetime, local_tz: pytz.BaseTzInfo) -> np.datetime64:
+    if date.tzinfo is not None:
+        date = date.astimezone(local_tz).replace(tzinfo=None)
+
+    return np.datetime64(date, "us")
@@ -0,0 +1,121 @@
+import asyncio
+import time
+import typing
+
+import helpers.database as database
+import numpy as np
+from helpers.currencies import currencies
+
+
+class CurrencyRateCache:
+    def __init__(self, currency_codes: typing.List[str]):
+        self.currencies = list(currency_codes)
+        self.index = {currency: i for i, currency in enumerate(self.currencies)}
+        self.matrix = self._empty_matrix()
+        self.loaded_at: typing.Optional[float] = None
+        self.invalidated = asyncio.Event()
+
+    async def load(self) -> None:
+        collection = database.get_collection("currency_rates")
+
+        matrix = self._empty_matrix()
+        async for doc in collection.find({"_id": {"$in": self.currencies}}):
+            row = self.index[doc["_id"]]
+
+            for currency, rate in doc.items():
+                if currency in self.index:
+                    matrix[row, self.index[currency]] = rate
+
+        self.matrix = matrix
+        self.loaded_at = time.monotonic()
+
+    def invalidate(self) -> None:
+        self.invalidated.set()
+
+    def is_loaded(self) -> bool:
+        return self.loaded_at is not None
+
+    def age(self) -> typing.Optional[float]:
+        if self.loaded_at is None:
+            return None
+
+        return time.monotonic() - self.loaded_at
+
+    def rates_to(self, currency: str) -> np.ndarray:
+        return self.matrix[:, self.index[currency]]
+
+    def has_rates_to(self, currency: str) -> bool:
+        return self.is_loaded() and not np.isnan(self.rates_to(currency)).any()
+
+    def get_indexes(self, currency_codes: typing.List[str]) -> np.ndarray:
+        try:
+            return np.fromiter(
+                (self.index[code] for code in currency_codes),
+                dtype=np.intp,
+                count=len(currency_codes),
+            )
+        except KeyError as e:
+            raise ValueError(f"Unsupported currency: {e.args[0]}")
+
+    def convert_amounts(
+        self, amounts: np.ndarray, source_currencies: typing.List[str], currency: str
+    ) -> np.ndarray:
+        return self.convert_indexed_amounts(
+            amounts, self.get_indexes(source_currencies), currency
+        )
+
+    def convert_indexed_amounts(
+        self, amounts: np.ndarray, source_indexes: np.ndarray, currency: str
+    ) -> np.ndarray:
+        source_rates = self.rates_to(currency)[source_indexes]
+        if np.isnan(source_rates).any():
+            raise ValueError("Currency rates not available")
+
+        return amounts * source_rates
+
+    def convert_summary(
+        self, summary: typing.Dict[str, typing.Dict[str, float]], currency: str
+    ) -> typing.Dict[str, typing.Dict[str, float]]:
+        days = list(summary)
+        amounts = np.zeros((len(days), len(self.currencies)))
+
+        for row, day in enumerate(days):
+            for code, amount in summary[day].items():
+                if code not in self.index:
+                    raise ValueError(f"Unsupported currency: {code}")
+
+                amounts[row, self.index[code]] = amount
+
+        used_columns = amounts.any(axis=0)
+        target_rates = self.rates_to(currency)[used_columns]
+        if np.isnan(target_rates).any():
+            raise ValueError("Currency rates not available")
+
+        totals = amounts[:, used_columns] @ target_rates
+
+        return {
+            day: {currency: round(float(total), 2)} for day, total in zip(days, totals)
+        }
+
+    def to_dict(self) -> typing.Dict[str, typing.Dict[str, float]]:
+        rates_per_currency = {}
+
+        for row, currency in enumerate(self.currencies):
+            rates = {
+                other_currency: float(self.matrix[row, column])
+                for column, other_currency in enumerate(self.currencies)
+                if column != row and not np.isnan(self.matrix[row, column])
+            }
+
+            if rates:
+                rates_per_currency[currency] = rates
+
+        return rates_per_currency
+
+    def _empty_matrix(self) -> np.ndarray:
+        matrix = np.full((len(self.currencies), len(self.currencies)), np.nan)
+        np.fill_diagonal(matrix, 1.0)
+        return matrix
+
+
+currency_rates = CurrencyRateCache(currencies)
@@ -0,0 +1,249 @@
+import argparse
+import asyncio
+import datetime
+import json
+import os
+import typing
+
+import bson
+import helpers.database as database
+import pymongo
+import pytz
+
+ROLLUP_TIMEZONE = os.getenv("ROLLUP_TIMEZONE", "UTC")
+
+RollupKey = typing.Tuple[bson.ObjectId, str, str, str]
+
+
+def get_rollup_day(date: datetime.datetime) -> str:
+    if date.tzinfo is None:
+        date = pytz.utc.localize(date)
+
+    return date.astimezone(pytz.timezone(ROLLUP_TIMEZONE)).date().isoformat()
+
+
+def get_rollup_key(doc: typing.Mapping[str, typing.Any]) -> RollupKey:
+    return (
+        doc["user"],
+        get_rollup_day(doc["date"]),
+        doc["currency"],
+        doc["category"],
+    )
+
+
+def to_cents(amount: float) -> int:
+    return round(amount * 100)
+
+
+async def apply_changes(
+    added: typing.Iterable[typing.Mapping[str, typing.Any]] = (),
+    removed: typing.Iterable[typing.Mapping[str, typing.Any]] = (),
+) -> None:
+    increments: typing.Dict[RollupKey, typing.List[int]] = {}
+
+    for docs, sign in [(added, 1), (removed, -1)]:
+        for doc in docs:
+            increment = increments.setdefault(get_rollup_key(doc), [0, 0])
+            increment[0] += sign * to_cents(doc["amount"])
+            increment[1] += sign
+
+    operations: typing.List[typing.Any] = [
+        pymongo.UpdateOne(
+            {"user": user, "day": day, "currency": currency, "category": category},
+            {"$inc": {"amount_cents": amount_cents, "count": count}},
+            upsert=True,
+        )
+        for (user, day, currency, category), (amount_cents, count) in increments.items()
+        if amount_cents != 0 or count != 0
+    ]
+
+    if not operations:
+        return
+
+    operations.extend(
+        pymongo.DeleteOne(
+            {
+                "user": user,
+                "day": day,
+                "currency": currency,
+                "category": category,
+                "count": {"$lte": 0},
+            }
+        )
+        for (user, day, currency, category), (_, count) in increments.items()
+        if count < 0
+    )
+
+    await database.get_collection("rollups").bulk_write(operations)
+
+
+async def summarize(
+    user_id: bson.ObjectId, start_day: str, end_day: str
+) -> typing.Dict[str, typing.Dict[str, float]]:
+    pipeline = [
+        {"$match": {"user": user_id, "day": {"$gte": start_day, "$lte": end_day}}},
+        {
+            "$group": {
+                "_id": {"day": "$day", "currency": "$currency"},
+                "amount_cents": {"$sum": "$amount_cents"},
+            }
+        },
+    ]
+
+    summary: typing.Dict[str, typing.Dict[str, float]] = {}
+    async for doc in database.get_collection("rollups").aggregate(pipeline):
+        summary.setdefault(doc["_id"]["day"], {})[doc["_id"]["currency"]] = (
+            doc["amount_cents"] / 100
+        )
+
+    return summary
+
+
+def get_rebuild_pipeline(
+    user_id: typing.Optional[bson.ObjectId] = None,
+) -> typing.List[typing.Dict[str, typing.Any]]:
+    match = {"user": user_id} if user_id is not None else {}
+
+    return [
+        {"$match": match},
+        {
+            "$group": {
+                "_id": {
+                    "user": "$user",
+                    "day": {
+                        "$dateToString": {
+                            "format": "%Y-%m-%d",
+                            "date": "$date",
+                            "timezone": ROLLUP_TIMEZONE,
+                        }
+                    },
+                    "currency": "$currency",
+                    "category": "$category",
+                },
+                "amount_cents": {
+                    "$sum": {"$toLong": {"$round": [{"$multiply": ["$amount", 100]}]}}
+                },
+                "count": {"$sum": 1},
+            }
+        },
+        {
+            "$project": {
+                "_id": 0,
+                "user": "$_id.user",
+                "day": "$_id.day",
+                "currency": "$_id.currency",
+                "category": "$_id.category",
+                "amount_cents": 1,
+                "count": 1,
+            }
+        },
+    ]
+
+
+async def backfill(user_id: typing.Optional[bson.ObjectId] = None) -> int:
+    rollups_collection = database.get_collection("rollups")
+    finances_collection = database.get_collection("finances")
+
+    await rollups_collection.delete_many(
+        {"user": user_id} if user_id is not None else {}
+    )
+
+    pipeline = get_rebuild_pipeline(user_id)
+    pipeline.append(
+        {
+            "$merge": {
+                "into": "rollups",
+                "on": ["user", "day", "currency", "category"],
+                "whenMatched": "replace",
+                "whenNotMatched": "insert",
+            }
+        }
+    )
+    await finances_collection.aggregate(pipeline).to_list(None)
+
+    return await rollups_collection.count_documents(
+        {"user": user_id} if user_id is not None else {}
+    )
+
+
+async def ensure_backfilled() -> None:
+    rollups_collection = database.get_collection("rollups")
+    finances_collection = database.get_collection("finances")
+
+    if await rollups_collection.find_one({}, {"_id": 1}) is not None:
+        return
+
+    if await finances_collection.find_one({}, {"_id": 1}) is None:
+        return
+
+    await backfill()
+
+
+async def verify(
+    user_id: typing.Optional[bson.ObjectId] = None,
+) -> typing.List[typing.Dict[str, typing.Any]]:
+    def key(doc: typing.Mapping[str, typing.Any]) -> RollupKey:
+        return (doc["user"], doc["day"], doc["currency"], doc["category"])
+
+    expected = {
+        key(doc): doc
+        async for doc in database.get_collection("finances").aggregate(
+            get_rebuild_pipeline(user_id)
+        )
+    }
+    actual = {
+        key(doc): doc
+        async for doc in database.get_collection("rollups").find(
+            {"user": user_id} if user_id is not None else {}, {"_id": 0}
+        )
+    }
+
+    mismatches = []
+    for rollup_key in expected.keys() | actual.keys():
+        expected_doc = expected.get(rollup_key, {})
+        actual_doc = actual.get(rollup_key, {})
+
+        expected_values = (
+            expected_doc.get("amount_cents", 0),
+            expected_doc.get("count", 0),
+        )
+        actual_values = (actual_doc.get("amount_cents", 0), actual_doc.get("count", 0))
+
+        if expected_values != actual_values:
+            mismatches.append(
+                {
+                    "user": str(rollup_key[0]),
+                    "day": rollup_key[1],
+                    "currency": rollup_key[2],
+                    "category": rollup_key[3],
+                    "expected": dict(zip(["amount_cents", "count"], expected_values)),
+                    "actual": dict(zip(["amount_cents", "count"], actual_values)),
+                }
+            )
+
+    return mismatches
+
+
+async def _run_command(command: str, user: typing.Optional[str]):
+    mongodb_client, _ = database.init_database()
+    user_id = bson.ObjectId(user) if user is not None else None
+
+    try:
+        await database.ensure_indexes()
+
+        if command == "backfill":
+            print(json.dumps({"rollups": await backfill(user_id)}))
+        else:
+            mismatches = await verify(user_id)
+            print(json.dumps({"mismatches": mismatches}, indent=2))
+    finally:
+        mongodb_client.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("command", choices=["backfill", "verify"])
+    parser.add_argument("--user")
+    args = parser.parse_args()
+
+    asyncio.run(_run_command(args.command, args.user))
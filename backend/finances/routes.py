@@ -1,17 +1,29 @@
+import os
 import typing
 
 import auth.functions as auth_functions
 import auth.models as auth_models
 import bson
 import fastapi
+import httpx
+import orjson
+import pydantic
+from fastapi.responses import StreamingResponse
+from helpers import responses
+from helpers.currencies import currencies
+from helpers.responses import LeanJSONResponse
 from starlette.datastructures import UploadFile
 
-from . import functions, models
+from . import analytics, csv_parser, functions, ingestion, models, rates
 
 router = fastapi.APIRouter(
     prefix="/finances",
 )
 
+BULK_MAX_ITEMS = int(os.getenv("BULK_MAX_ITEMS", "5000"))
+BULK_IGNORED_FIELDS = frozenset({"id", "_id", "user", "is_subscription"})
+NDJSON_BATCH_SIZE = int(os.getenv("NDJSON_BATCH_SIZE", "500"))
+
 
 @router.get(
     "/",
@@ -23,13 +35,17 @@ router = fastapi.APIRouter(
     status_code=200,
 )
 async def list_finance_items(
+    request: fastapi.Request,
     startDate: typing.Optional[str] = None,
     endDate: typing.Optional[str] = None,
+    limit: typing.Optional[int] = fastapi.Query(default=None, gt=0),
+    cursor: typing.Optional[str] = None,
+    convertTo: typing.Optional[str] = None,
     current_user: auth_models.User = fastapi.Depends(auth_functions.get_current_user),
     finance_wrapper: models.FinanceItemWrapper = fastapi.Depends(
         models.get_finance_wrapper
     ),
-) -> typing.List[typing.Union[models.FinanceItem, models.SubscriptionItem]]:
+) -> typing.Any:
     if current_user.id is None:
         raise fastapi.HTTPException(status_code=401, detail="User not authenticated")
 
@@ -38,11 +54,96 @@ async def list_finance_items(
             status_code=400, detail="startDate and endDate query parameters required"
         )
 
-    generator = finance_wrapper.list_items(startDate, endDate, current_user.id)
+    if convertTo is not None:
+        if convertTo not in currencies:
+            raise fastapi.HTTPException(status_code=400, detail="Unsupported currency")
+
+        if not rates.currency_rates.has_rates_to(convertTo):
+            raise fastapi.HTTPException(
+                status_code=503, detail="Currency rates not available"
+            )
+
+    after = None
+    if cursor is not None:
+        try:
+            after = functions.decode_page_cursor(cursor)
+        except ValueError as e:
+            raise fastapi.HTTPException(status_code=400, detail=str(e))
+
+    generator = finance_wrapper.list_item_documents(
+        startDate, endDate, current_user.id, after=after
+    )
+
+    if "application/x-ndjson" in request.headers.get("accept", ""):
+        return StreamingResponse(
+            _stream_ndjson(generator, limit, convertTo),
+            media_type="application/x-ndjson",
+        )
+
+    headers = {}
+    docs = []
+    async for doc in generator:
+        if limit is not None and len(docs) == limit:
+            headers["X-Next-Cursor"] = functions.encode_page_cursor(
+                docs[-1]["date"], docs[-1]["id"]
+            )
+            break
 
-    items = [item async for item in generator]
+        docs.append(doc)
+
+    await generator.aclose()
+
+    if convertTo is not None:
+        try:
+            docs = functions.convert_documents(docs, convertTo)
+        except ValueError as e:
+            raise fastapi.HTTPException(status_code=503, detail=str(e))
+
+    return LeanJSONResponse(docs, headers=headers)
+
+
+async def _stream_ndjson(
+    generator: typing.AsyncGenerator[typing.Dict[str, typing.Any], None],
+    limit: typing.Optional[int],
+    currency: typing.Optional[str],
+) -> typing.AsyncGenerator[bytes, None]:
+    count = 0
+    batch: typing.List[typing.Dict[str, typing.Any]] = []
+    last_doc: typing.Dict[str, typing.Any] = {}
+    next_cursor = None
+
+    try:
+        async for doc in generator:
+            if limit is not None and count == limit:
+                next_cursor = functions.encode_page_cursor(
+                    last_doc["date"], last_doc["id"]
+                )
+                break
 
-    return items
+            batch.append(doc)
+            count += 1
+            last_doc = doc
+
+            if len(batch) == NDJSON_BATCH_SIZE:
+                yield _dump_ndjson_batch(batch, currency)
+                batch = []
+
+        if batch:
+            yield _dump_ndjson_batch(batch, currency)
+
+        if next_cursor is not None:
+            yield responses.dumps({"next_cursor": next_cursor}) + b"\n"
+    finally:
+        await generator.aclose()
+
+
+def _dump_ndjson_batch(
+    batch: typing.List[typing.Dict[str, typing.Any]], currency: typing.Optional[str]
+) -> bytes:
+    if currency is not None:
+        functions.convert_documents(batch, currency)
+
+    return b"".join(responses.dumps(doc) + b"\n" for doc in batch)
 
 
 @router.post(
@@ -94,6 +195,147 @@ async def create_finance_item(
     return created_finance_items
 
 
+@router.get(
+    "/analytics/",
+    response_description="Get spending per category and period",
+    response_model=typing.Dict[str, typing.Any],
+    status_code=200,
+)
+async def get_finance_analytics(
+    startDate: typing.Optional[str] = None,
+    endDate: typing.Optional[str] = None,
+    period: typing.Literal["day", "week", "month"] = "month",
+    convertTo: typing.Optional[str] = None,
+    current_user: auth_models.User = fastapi.Depends(auth_functions.get_current_user),
+    finance_wrapper: models.FinanceItemWrapper = fastapi.Depends(
+        models.get_finance_wrapper
+    ),
+) -> typing.Any:
+    if current_user.id is None:
+        raise fastapi.HTTPException(status_code=401, detail="User not authenticated")
+
+    if startDate is None or endDate is None:
+        raise fastapi.HTTPException(
+            status_code=400, detail="startDate and endDate query parameters required"
+        )
+
+    if convertTo is not None and convertTo not in currencies:
+        raise fastapi.HTTPException(status_code=400, detail="Unsupported currency")
+
+    columns = await analytics.load_columns(
+        finance_wrapper.list_item_documents(startDate, endDate, current_user.id)
+    )
+
+    try:
+        matrix = analytics.build_matrix(columns, period, convertTo)
+    except ValueError as e:
+        raise fastapi.HTTPException(status_code=503, detail=str(e))
+
+    return LeanJSONResponse(matrix)
+
+
+@router.post(
+    "/bulk/",
+    response_description="Add many finance items",
+    response_model=typing.List[typing.Dict[str, typing.Any]],
+    status_code=201,
+)
+async def create_finance_items(
+    request: fastapi.Request,
+    current_user: auth_models.User = fastapi.Depends(auth_functions.get_current_user),
+    finance_wrapper: models.FinanceItemWrapper = fastapi.Depends(
+        models.get_finance_wrapper
+    ),
+) -> typing.Any:
+    if current_user.id is None:
+        raise fastapi.HTTPException(status_code=401, detail="User not authenticated")
+
+    if request.headers.get("content-type", "").startswith("application/x-ndjson"):
+        request_data = await _read_ndjson(request)
+    else:
+        try:
+            request_data = orjson.loads(await request.body())
+        except orjson.JSONDecodeError:
+            raise fastapi.HTTPException(status_code=400, detail="Invalid JSON body")
+
+        if not isinstance(request_data, list):
+            raise fastapi.HTTPException(
+                status_code=400, detail="Request body must be a list of items"
+            )
+
+    if len(request_data) > BULK_MAX_ITEMS:
+        raise fastapi.HTTPException(
+            status_code=413, detail=f"At most {BULK_MAX_ITEMS} items are allowed"
+        )
+
+    results: typing.List[typing.Dict[str, typing.Any]] = []
+    finance_objects = []
+    valid_indexes = []
+
+    for index, item_data in enumerate(request_data):
+        try:
+            if not isinstance(item_data, dict):
+                raise ValueError("Item must be an object")
+
+            item_data = {
+                key: value
+                for key, value in item_data.items()
+                if key not in BULK_IGNORED_FIELDS
+            }
+            finance_objects.append(
+                models.FinanceItem(
+                    **item_data, user=current_user.id, is_subscription=False
+                )
+            )
+            valid_indexes.append(index)
+            results.append({"index": index, "id": None, "error": None})
+
+        except pydantic.ValidationError as e:
+            error = "; ".join(
+                f"{'.'.join(map(str, error['loc']))}: {error['msg']}"
+                for error in e.errors()
+            )
+            results.append({"index": index, "id": None, "error": error})
+
+        except (ValueError, TypeError) as e:
+            results.append({"index": index, "id": None, "error": str(e)})
+
+    created_items = await finance_wrapper.create_items(finance_objects)
+
+    for index, (item_id, error) in zip(valid_indexes, created_items):
+        if error is None:
+            results[index]["id"] = str(item_id)
+        else:
+            results[index]["error"] = error
+
+    return LeanJSONResponse(results, status_code=201)
+
+
+async def _read_ndjson(request: fastapi.Request) -> typing.List[typing.Any]:
+    request_data: typing.List[typing.Any] = []
+    pending = b""
+
+    async for chunk in request.stream():
+        pending += chunk
+        *lines, pending = pending.split(b"\n")
+        request_data.extend(_parse_ndjson_line(line) for line in lines if line.strip())
+
+        if len(request_data) > BULK_MAX_ITEMS:
+            break
+
+    if pending.strip():
+        request_data.append(_parse_ndjson_line(pending))
+
+    return request_data
+
+
+def _parse_ndjson_line(line: bytes) -> typing.Any:
+    try:
+        return orjson.loads(line)
+    except orjson.JSONDecodeError:
+        return None
+
+
 @router.get(
     "/{item_id}/",
     response_description="Get a finance item",
@@ -111,16 +353,20 @@ async def get_finance_item(
     if current_user.id is None:
         raise fastapi.HTTPException(status_code=401, detail="User not authenticated")
 
-    if (created_item := await finance_wrapper.get_item(item_id)) is None:
+    if (
+        created_item := await finance_wrapper.get_item_document(
+            item_id, current_user.id
+        )
+    ) is None:
         raise fastapi.HTTPException(status_code=404, detail="Item not found")
 
-    return created_item
+    return LeanJSONResponse(created_item)
 
 
 @router.put(
     "/{item_id}/",
     response_description="Update a finance item",
-    response_model=models.FinanceItem,
+    response_model=typing.Union[models.SubscriptionItem, models.FinanceItem],
     response_model_by_alias=False,
     status_code=200,
 )
@@ -131,47 +377,65 @@ async def update_finance_item(
     finance_wrapper: models.FinanceItemWrapper = fastapi.Depends(
         models.get_finance_wrapper
     ),
-) -> models.FinanceItem:
+) -> typing.Union[models.SubscriptionItem, models.FinanceItem]:
     if current_user.id is None:
         raise fastapi.HTTPException(status_code=401, detail="User not authenticated")
 
-    if (database_finance_item := await finance_wrapper.get_item(item_id)) is None:
+    if not bson.ObjectId.is_valid(item_id):
         raise fastapi.HTTPException(status_code=404, detail="Item not found")
 
-    if database_finance_item.user != current_user.id:
-        raise fastapi.HTTPException(
-            status_code=403, detail="User not authorized to update item"
-        )
-
     request_data = await request.json()
 
-    if functions.is_model_subscription(database_finance_item):
-        request_finance_item = models.SubscriptionItem(
-            **request_data,
-            user=current_user.id,
-            is_subscription=True,
-            _id=bson.ObjectId(item_id),
-        )
-        subscription_item = typing.cast(models.SubscriptionItem, database_finance_item)
-        is_updated = await finance_wrapper.update_subscription_item(
-            subscription_item, request_finance_item
+    request_finance_item = models.FinanceItem(
+        **request_data,
+        user=current_user.id,
+        _id=bson.ObjectId(item_id),
+        is_subscription=False,
+    )
+
+    if await finance_wrapper.update_item(
+        item_id, current_user.id, request_finance_item
+    ):
+        return request_finance_item
+
+    if "repeat_period" not in request_data or "repeat_value" not in request_data:
+        stored_item = await finance_wrapper.find_item(
+            item_id,
+            current_user.id,
+            projection={"repeat_period": 1, "repeat_value": 1},
         )
+        if stored_item is None or not stored_item.get("is_subscription"):
+            raise fastapi.HTTPException(status_code=404, detail="Item not found")
 
-    else:
-        request_finance_item = models.FinanceItem(
+        request_data = {
+            "repeat_period": stored_item.get("repeat_period"),
+            "repeat_value": stored_item.get("repeat_value"),
             **request_data,
-            user=current_user.id,
-            _id=bson.ObjectId(item_id),
-            is_subscription=False,
-        )
-        is_updated = await finance_wrapper.update_item(
-            database_finance_item, request_finance_item
+        }
+
+    request_subscription_item = models.SubscriptionItem(
+        **{"start_date": request_data.get("date"), **request_data},
+        user=current_user.id,
+        is_subscription=True,
+        _id=bson.ObjectId(item_id),
+    )
+
+    try:
+        updated_subscription_item = await finance_wrapper.update_subscription_item(
+            item_id,
+            current_user.id,
+            request_subscription_item,
+            expected_version=request_data.get("version"),
         )
+    except models.VersionConflictError as e:
+        raise fastapi.HTTPException(status_code=409, detail=str(e))
+    except ValueError as e:
+        raise fastapi.HTTPException(status_code=400, detail=str(e))
 
-    if not is_updated:
+    if updated_subscription_item is None:
         raise fastapi.HTTPException(status_code=404, detail="Item not updated")
 
-    return request_finance_item
+    return updated_subscription_item
 
 
 @router.delete(
@@ -190,24 +454,21 @@ async def delete_finance_item(
     if current_user.id is None:
         raise fastapi.HTTPException(status_code=401, detail="User not authenticated")
 
-    if (finance_item := await finance_wrapper.get_item(item_id)) is None:
+    if not bson.ObjectId.is_valid(item_id):
         raise fastapi.HTTPException(status_code=404, detail="Item not found")
 
-    if finance_item.user != current_user.id:
-        raise fastapi.HTTPException(
-            status_code=403, detail="User not authorized to delete item"
-        )
-
     try:
-        if functions.is_model_subscription(finance_item):
-            subscription_item = typing.cast(models.SubscriptionItem, finance_item)
-            await finance_wrapper.delete_subscription_item(item=subscription_item)
-        else:
-            await finance_wrapper.delete_item(item=finance_item)
-
+        is_deleted = await finance_wrapper.delete_item(
+            item_id=item_id, user_id=current_user.id
+        ) or await finance_wrapper.delete_subscription_item(
+            item_id=item_id, user_id=current_user.id
+        )
     except Exception:
         raise fastapi.HTTPException(status_code=404, detail="Item not deleted")
 
+    if not is_deleted:
+        raise fastapi.HTTPException(status_code=404, detail="Item not found")
+
     return item_id
 
 
@@ -234,26 +495,29 @@ async def pause_subscription_item(
     if current_user.id is None:
         raise fastapi.HTTPException(status_code=401, detail="User not authenticated")
 
-    if (finance_item := await finance_wrapper.get_item(item_id)) is None:
+    if not bson.ObjectId.is_valid(item_id):
         raise fastapi.HTTPException(status_code=404, detail="Item not found")
 
-    if finance_item.user != current_user.id:
-        raise fastapi.HTTPException(
-            status_code=403, detail="User not authorized to pause item"
-        )
-
-    if not functions.is_model_subscription(finance_item):
-        raise fastapi.HTTPException(
-            status_code=400, detail="Item is not a subscription"
-        )
-
-    subscription_item = typing.cast(models.SubscriptionItem, finance_item)
     if (
         paused_subscription_item := await finance_wrapper.pause_subscription_item(
-            subscription_item, endDate
+            item_id, current_user.id, endDate
         )
     ) is None:
-        raise fastapi.HTTPException(status_code=404, detail="Item not paused")
+        stored_item = await finance_wrapper.find_item(
+            item_id, current_user.id, projection={"superseded_by": 1}
+        )
+
+        if stored_item is None:
+            raise fastapi.HTTPException(status_code=404, detail="Item not found")
+
+        if not stored_item.get("is_subscription"):
+            raise fastapi.HTTPException(
+                status_code=400, detail="Item is not a subscription"
+            )
+
+        raise fastapi.HTTPException(
+            status_code=409, detail="Subscription was superseded by a newer version"
+        )
 
     return paused_subscription_item
 
@@ -261,14 +525,15 @@ async def pause_subscription_item(
 @router.post(
     "/upload/",
     response_description="Upload a file",
-    response_model=typing.List[functions.BotResponse],
+    response_model=typing.List[ingestion.BotResponse],
     response_model_by_alias=False,
     status_code=201,
 )
 async def upload_file(
     request: fastapi.Request,
+    response: fastapi.Response,
     current_user: auth_models.User = fastapi.Depends(auth_functions.get_current_user),
-) -> typing.List[functions.BotResponse]:
+) -> typing.List[ingestion.BotResponse]:
     if current_user.id is None:
         raise fastapi.HTTPException(status_code=401, detail="User not authenticated")
 
@@ -281,27 +546,24 @@ async def upload_file(
     if file.filename is None or not file.filename.endswith(".csv"):
         raise Exception("File must be a CSV")
 
-    file_content = await file.read()
-    try:
-        csv_content = file_content.decode("utf-8").splitlines()
-    except UnicodeDecodeError:
-        try:
-            csv_content = file_content.decode("cp1250").splitlines()
-        except UnicodeDecodeError:
-            csv_content = file_content.decode("latin-1").splitlines()
+    csv_content = await csv_parser.read_lines(file)
 
     if csv_content == []:
         raise fastapi.HTTPException(
             status_code=400, detail="Could not decode file with supported encodings"
         )
 
-    csv_content = csv_content[1:]
-
+    stats = ingestion.ExtractionStats()
     try:
-        bot_response = functions.ask_bot(csv_content)
+        bot_response = await ingestion.import_statement(
+            csv_content[1:], header=csv_content[0], stats=stats
+        )
     except Exception as e:
         raise fastapi.HTTPException(status_code=400, detail=str(e))
 
+    if (cache_hit_rate := stats.cache_hit_rate()) is not None:
+        response.headers["X-Cache-Hit-Rate"] = f"{cache_hit_rate:.3f}"
+
     return bot_response
 
 
@@ -320,7 +582,13 @@ async def update_currency_rates(
     if current_user.id is None:
         raise fastapi.HTTPException(status_code=401, detail="User not authenticated")
 
-    await functions.update_currency_rates()
+    try:
+        is_updated = await functions.update_currency_rates()
+    except (ValueError, httpx.HTTPError) as e:
+        raise fastapi.HTTPException(status_code=502, detail=str(e))
+
+    if not is_updated:
+        return "Currency rates up to date"
 
     return "Currency rates updated"
 
@@ -331,5 +599,9 @@ async def update_currency_rates(
     status_code=200,
     response_model=typing.Dict[str, typing.Dict[str, float]],
 )
-async def get_currency_rates() -> typing.Dict[str, typing.Dict[str, float]]:
-    return await functions.get_currency_rates()
+async def get_currency_rates() -> typing.Any:
+    headers = {}
+    if (age := rates.currency_rates.age()) is not None:
+        headers["Age"] = str(int(age))
+
+    return LeanJSONResponse(functions.get_currency_rates(), headers=headers)
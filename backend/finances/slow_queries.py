@@ -0,0 +1,299 @@
+import asyncio
+import datetime
+import json
+import logging
+import os
+import random
+import time
+import typing
+
+import helpers.database as database
+import pymongo
+import pymongo.errors
+from motor.motor_asyncio import AsyncIOMotorCollection
+
+logger = logging.getLogger(__name__)
+
+SLOW_QUERY_THRESHOLD_MS = float(os.getenv("SLOW_QUERY_THRESHOLD_MS", "100"))
+SLOW_QUERY_EXPLAIN_SAMPLE_RATE = float(
+    os.getenv("SLOW_QUERY_EXPLAIN_SAMPLE_RATE", "0.1")
+)
+SLOW_QUERY_CAPPED_SIZE_BYTES = int(
+    os.getenv("SLOW_QUERY_CAPPED_SIZE_BYTES", str(16 * 1024 * 1024))
+)
+SLOW_QUERY_CAPPED_MAX_DOCUMENTS = int(
+    os.getenv("SLOW_QUERY_CAPPED_MAX_DOCUMENTS", "10000")
+)
+
+Sort = typing.List[typing.Tuple[str, int]]
+
+pending_records: typing.Set[asyncio.Task] = set()
+
+
+async def ensure_collection() -> None:
+    try:
+        await database.mongodb_database.create_collection(
+            "slow_queries",
+            capped=True,
+            size=SLOW_QUERY_CAPPED_SIZE_BYTES,
+            max=SLOW_QUERY_CAPPED_MAX_DOCUMENTS,
+        )
+    except pymongo.errors.CollectionInvalid:
+        pass
+
+
+def find(
+    collection: AsyncIOMotorCollection,
+    query: typing.Dict[str, typing.Any],
+    sort: typing.Optional[Sort] = None,
+) -> typing.AsyncIterator[typing.Dict[str, typing.Any]]:
+    cursor = collection.find(query)
+    command: typing.Dict[str, typing.Any] = {"find": collection.name, "filter": query}
+
+    if sort is not None:
+        cursor = cursor.sort(sort)
+        command["sort"] = dict(sort)
+
+    return _iterate(collection, cursor, command)
+
+
+async def find_all(
+    collection: AsyncIOMotorCollection,
+    query: typing.Dict[str, typing.Any],
+    sort: typing.Optional[Sort] = None,
+) -> typing.List[typing.Dict[str, typing.Any]]:
+    return [doc async for doc in find(collection, query, sort)]
+
+
+def aggregate(
+    collection: AsyncIOMotorCollection,
+    pipeline: typing.List[typing.Dict[str, typing.Any]],
+) -> typing.AsyncIterator[typing.Dict[str, typing.Any]]:
+    return _iterate(
+        collection,
+        collection.aggregate(pipeline),
+        {"aggregate": collection.name, "pipeline": pipeline, "cursor": {}},
+    )
+
+
+async def aggregate_all(
+    collection: AsyncIOMotorCollection,
+    pipeline: typing.List[typing.Dict[str, typing.Any]],
+) -> typing.List[typing.Dict[str, typing.Any]]:
+    return [doc async for doc in aggregate(collection, pipeline)]
+
+
+async def record(
+    collection: AsyncIOMotorCollection,
+    command: typing.Dict[str, typing.Any],
+    duration: float,
+    returned: int,
+) -> None:
+    operation = next(iter(command))
+    query = command["filter"] if operation == "find" else command["pipeline"]
+
+    doc: typing.Dict[str, typing.Any] = {
+        "collection": collection.name,
+        "operation": operation,
+        "shape": get_query_shape(query),
+        "sort": format_sort(command.get("sort")),
+        "filter" if operation == "find" else "pipeline": query,
+        "duration_ms": round(duration * 1000, 3),
+        "returned": returned,
+        "sampled": False,
+        "created_at": datetime.datetime.now(datetime.timezone.utc),
+    }
+
+    if random.random() < SLOW_QUERY_EXPLAIN_SAMPLE_RATE:
+        try:
+            doc.update(await explain(collection, command), sampled=True)
+        except pymongo.errors.PyMongoError as error:
+            logger.warning("Could not explain slow %s: %r", operation, error)
+
+    await database.get_collection("slow_queries").insert_one(doc)
+
+
+async def explain(
+    collection: AsyncIOMotorCollection,
+    command: typing.Dict[str, typing.Any],
+) -> typing.Dict[str, typing.Any]:
+    response = await collection.database.command(
+        {"explain": command, "verbosity": "executionStats"}
+    )
+
+    return summarize_explain(response)
+
+
+def summarize_explain(
+    response: typing.Dict[str, typing.Any],
+) -> typing.Dict[str, typing.Any]:
+    sections = list(_iter_explain_sections(response))
+    execution_stats = [section.get("executionStats", {}) for section in sections]
+    stages = [
+        stage
+        for section in sections
+        for stage in _iter_stages(
+            section.get("queryPlanner", {}).get("winningPlan", {})
+        )
+    ]
+
+    return {
+        "plan": [stage.get("stage") for stage in stages],
+        "indexes": sorted(
+            {stage["indexName"] for stage in stages if "indexName" in stage}
+        ),
+        "docs_examined": sum(
+            stats.get("totalDocsExamined", 0) for stats in execution_stats
+        ),
+        "keys_examined": sum(
+            stats.get("totalKeysExamined", 0) for stats in execution_stats
+        ),
+        "collection_scan": any(stage.get("stage") == "COLLSCAN" for stage in stages),
+        "in_memory_sort": any(
+            stage.get("stage") in {"SORT", "SORT_KEY_GENERATOR"} for stage in stages
+        ),
+    }
+
+
+async def list_worst(limit: int = 20) -> typing.List[typing.Dict[str, typing.Any]]:
+    pipeline: typing.List[typing.Dict[str, typing.Any]] = [
+        {
+            "$group": {
+                "_id": {
+                    "collection": "$collection",
+                    "operation": "$operation",
+                    "shape": "$shape",
+                    "sort": "$sort",
+                },
+                "count": {"$sum": 1},
+                "sampled": {"$sum": {"$cond": ["$sampled", 1, 0]}},
+                "max_duration_ms": {"$max": "$duration_ms"},
+                "avg_duration_ms": {"$avg": "$duration_ms"},
+                "avg_returned": {"$avg": "$returned"},
+                "max_docs_examined": {"$max": "$docs_examined"},
+                "max_keys_examined": {"$max": "$keys_examined"},
+                "collection_scan": {"$max": {"$ifNull": ["$collection_scan", False]}},
+                "in_memory_sort": {"$max": {"$ifNull": ["$in_memory_sort", False]}},
+                "plan": {"$last": "$plan"},
+                "last_seen": {"$max": "$created_at"},
+            }
+        },
+        {
+            "$sort": {
+                "collection_scan": pymongo.DESCENDING,
+                "in_memory_sort": pymongo.DESCENDING,
+                "max_duration_ms": pymongo.DESCENDING,
+            }
+        },
+        {"$limit": limit},
+    ]
+
+    offenders = []
+    async for doc in database.get_collection("slow_queries").aggregate(pipeline):
+        offenders.append({**doc.pop("_id"), **doc})
+
+    return offenders
+
+
+def get_query_shape(query: typing.Any) -> str:
+    return json.dumps(_mask_values(query), sort_keys=True)
+
+
+def format_sort(
+    sort: typing.Optional[typing.Dict[str, int]],
+) -> typing.Optional[str]:
+    if sort is None:
+        return None
+
+    return ",".join(f"{field}:{direction}" for field, direction in sort.items())
+
+
+def _mask_values(value: typing.Any) -> typing.Any:
+    if isinstance(value, dict):
+        return {key: _mask_values(item) for key, item in value.items()}
+
+    if isinstance(value, list):
+        masked = [_mask_values(item) for item in value if isinstance(item, dict)]
+        return masked or 1
+
+    return 1
+
+
+def _iter_stages(
+    plan: typing.Dict[str, typing.Any],
+) -> typing.Iterator[typing.Dict[str, typing.Any]]:
+    if "queryPlan" in plan:
+        plan = plan["queryPlan"]
+
+    if "stage" in plan:
+        yield plan
+
+    if "inputStage" in plan:
+        yield from _iter_stages(plan["inputStage"])
+
+    for input_stage in plan.get("inputStages", []):
+        yield from _iter_stages(input_stage)
+
+
+async def _iterate(
+    collection: AsyncIOMotorCollection,
+    cursor: typing.Any,
+    command: typing.Dict[str, typing.Any],
+) -> typing.AsyncGenerator[typing.Dict[str, typing.Any], None]:
+    duration = 0.0
+    returned = 0
+
+    try:
+        while True:
+            start = time.perf_counter()
+            try:
+                doc = await anext(cursor)
+            except StopAsyncIteration:
+                break
+            finally:
+                duration += time.perf_counter() - start
+
+            returned += 1
+            yield doc
+    finally:
+        if duration * 1000 >= SLOW_QUERY_THRESHOLD_MS:
+            _schedule_record(collection, command, duration, returned)
+
+
+def _iter_explain_sections(
+    value: typing.Any,
+) -> typing.Iterator[typing.Dict[str, typing.Any]]:
+    if isinstance(value, dict):
+        if "queryPlanner" in value or "executionStats" in value:
+            yield value
+            return
+
+        value = list(value.values())
+
+    if isinstance(value, list):
+        for item in value:
+            yield from _iter_explain_sections(item)
+
+
+def _schedule_record(
+    collection: AsyncIOMotorCollection,
+    command: typing.Dict[str, typing.Any],
+    duration: float,
+    returned: int,
+) -> None:
+    try:
+        task = asyncio.get_running_loop().create_task(
+            record(collection, command, duration, returned)
+        )
+    except RuntimeError:
+        return
+
+    pending_records.add(task)
+    task.add_done_callback(_finish_record)
+
+
+def _finish_record(task: asyncio.Task) -> None:
+    pending_records.discard(task)
+
+    if not task.cancelled() and task.exception() is not None:
+        logger.warning("Could not record slow query: %r", task.exception())
@@ -0,0 +1,190 @@
+import asyncio
+import datetime
+import logging
+import os
+import typing
+
+import bson
+import helpers.database as database
+import pymongo
+import pymongo.errors
+import pytz
+from dateutil.relativedelta import relativedelta
+
+from . import occurrences
+
+logger = logging.getLogger(__name__)
+
+OCCURRENCE_TIMEZONE = os.getenv("SUBSCRIPTION_OCCURRENCE_TIMEZONE", "UTC")
+HORIZON_MONTHS = int(os.getenv("SUBSCRIPTION_HORIZON_MONTHS", "12"))
+EXTENDER_INTERVAL_SECONDS = float(
+    os.getenv("SUBSCRIPTION_EXTENDER_INTERVAL_SECONDS", str(24 * 60 * 60))
+)
+
+
+def to_utc(date: datetime.datetime) -> datetime.datetime:
+    if date.tzinfo is None:
+        return pytz.utc.localize(date)
+
+    return date.astimezone(pytz.utc)
+
+
+def get_horizon(now: typing.Optional[datetime.datetime] = None) -> datetime.datetime:
+    now = now or datetime.datetime.now(pytz.utc)
+
+    return to_utc(now) + relativedelta(months=HORIZON_MONTHS)
+
+
+def is_materialized(
+    doc: typing.Mapping[str, typing.Any], end_date: datetime.datetime
+) -> bool:
+    materialized_until = doc.get("materialized_until")
+    if materialized_until is None:
+        return False
+
+    materialized_until = to_utc(materialized_until)
+    if doc.get("end_date") is not None and materialized_until >= to_utc(
+        doc["end_date"]
+    ):
+        return True
+
+    return materialized_until >= to_utc(end_date)
+
+
+async def materialize(
+    doc: typing.Mapping[str, typing.Any],
+    until: typing.Optional[datetime.datetime] = None,
+) -> datetime.datetime:
+    until = to_utc(until or get_horizon())
+    since = doc.get("materialized_until")
+    if since is not None:
+        since = to_utc(since)
+
+    start_date = to_utc(doc["start_date"])
+    end_date = to_utc(doc["end_date"]) if doc.get("end_date") is not None else None
+
+    if end_date is not None:
+        until = min(until, max(end_date, start_date))
+
+    if since is not None and since >= until:
+        return since
+
+    documents = [
+        {"subscription": doc["_id"], "user": doc["user"], "date": date}
+        for date in occurrences.iter_occurrences(
+            start_date,
+            doc["repeat_period"],
+            doc["repeat_value"],
+            window_start=since or start_date,
+            window_end=until,
+            end_date=end_date,
+            timezone=OCCURRENCE_TIMEZONE,
+        )
+        if since is None or date > since
+    ]
+
+    if documents:
+        try:
+            await database.get_collection("subscription_occurrences").insert_many(
+                documents, ordered=False
+            )
+        except pymongo.errors.BulkWriteError as e:
+            if any(
+                error["code"] != 11000 for error in e.details.get("writeErrors", [])
+            ):
+                raise
+
+    await database.get_collection("subscriptions").update_one(
+        {"_id": doc["_id"], "materialized_until": doc.get("materialized_until")},
+        {"$set": {"materialized_until": until}},
+    )
+
+    return until
+
+
+async def invalidate_after(
+    subscription_id: bson.ObjectId, date: typing.Optional[datetime.datetime] = None
+) -> None:
+    query: typing.Dict[str, typing.Any] = {"subscription": subscription_id}
+    if date is not None:
+        query["date"] = {"$gt": to_utc(date)}
+
+    await database.get_collection("subscription_occurrences").delete_many(query)
+
+
+async def list_subscription_dates(
+    subscription_id: bson.ObjectId, end_date: datetime.datetime
+) -> typing.List[datetime.datetime]:
+    cursor = (
+        database.get_collection("subscription_occurrences")
+        .find(
+            {"subscription": subscription_id, "date": {"$lte": end_date}},
+            {"_id": 0, "date": 1},
+        )
+        .sort([("date", pymongo.ASCENDING)])
+    )
+
+    return [to_utc(doc["date"]) async for doc in cursor]
+
+
+async def list_dates(
+    user_id: bson.ObjectId,
+    start_date: datetime.datetime,
+    end_date: datetime.datetime,
+) -> typing.Dict[bson.ObjectId, typing.List[datetime.datetime]]:
+    cursor = (
+        database.get_collection("subscription_occurrences")
+        .find(
+            {"user": user_id, "date": {"$gte": start_date, "$lte": end_date}},
+            {"_id": 0, "subscription": 1, "date": 1},
+        )
+        .sort([("date", pymongo.ASCENDING)])
+    )
+
+    dates: typing.Dict[bson.ObjectId, typing.List[datetime.datetime]] = {}
+    async for doc in cursor:
+        dates.setdefault(doc["subscription"], []).append(to_utc(doc["date"]))
+
+    return dates
+
+
+async def extend_all(until: typing.Optional[datetime.datetime] = None) -> int:
+    until = to_utc(until or get_horizon())
+    collection = database.get_collection("subscriptions")
+
+    cursor = collection.find(
+        {
+            "$and": [
+                {
+                    "$or": [
+                        {"materialized_until": None},
+                        {"materialized_until": {"$lt": until}},
+                    ]
+                },
+                {
+                    "$or": [
+                        {"end_date": None},
+                        {"materialized_until": None},
+                        {"$expr": {"$gt": ["$end_date", "$materialized_until"]}},
+                    ]
+                },
+            ]
+        }
+    )
+
+    extended = 0
+    async for doc in cursor:
+        await materialize(doc, until)
+        extended += 1
+
+    return extended
+
+
+async def run_extender(interval_seconds: float = EXTENDER_INTERVAL_SECONDS):
+    while True:
+        try:
+            await extend_all()
+        except Exception:
+            logger.exception("Subscription occurrences extension failed")
+
+        await asyncio.sleep(interval_seconds)
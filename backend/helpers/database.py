@@ -1,7 +1,11 @@
+import asyncio
+import json
 import os
 import typing
 
 import dotenv
+import pymongo
+from helpers import metrics, pool
 from motor.motor_asyncio import (
     AsyncIOMotorClient,
     AsyncIOMotorCollection,
@@ -21,6 +25,80 @@ mongodb_client: AsyncIOMotorClient
 mongodb_database: AsyncIOMotorDatabase
 collections: typing.Dict[str, AsyncIOMotorCollection] = {}
 
+indexes: typing.Dict[str, typing.List[pymongo.IndexModel]] = {
+    "users": [
+        pymongo.IndexModel(
+            [("username", pymongo.ASCENDING)], name="username_unique", unique=True
+        ),
+    ],
+    "finances": [
+        pymongo.IndexModel(
+            [
+                ("user", pymongo.ASCENDING),
+                ("date", pymongo.ASCENDING),
+                ("_id", pymongo.ASCENDING),
+            ],
+            name="user_date_id",
+        ),
+    ],
+    "subscriptions": [
+        pymongo.IndexModel(
+            [
+                ("user", pymongo.ASCENDING),
+                ("start_date", pymongo.ASCENDING),
+                ("end_date", pymongo.ASCENDING),
+            ],
+            name="user_start_date_end_date",
+        ),
+        pymongo.IndexModel(
+            [("supersedes", pymongo.ASCENDING)],
+            name="supersedes_unique",
+            unique=True,
+            partialFilterExpression={"supersedes": {"$type": "objectId"}},
+        ),
+    ],
+    "subscription_occurrences": [
+        pymongo.IndexModel(
+            [
+                ("user", pymongo.ASCENDING),
+                ("date", pymongo.ASCENDING),
+            ],
+            name="user_date",
+        ),
+        pymongo.IndexModel(
+            [
+                ("subscription", pymongo.ASCENDING),
+                ("date", pymongo.ASCENDING),
+            ],
+            name="subscription_date_unique",
+            unique=True,
+        ),
+    ],
+    "rollups": [
+        pymongo.IndexModel(
+            [
+                ("user", pymongo.ASCENDING),
+                ("day", pymongo.ASCENDING),
+                ("currency", pymongo.ASCENDING),
+                ("category", pymongo.ASCENDING),
+            ],
+            name="user_day_currency_category_unique",
+            unique=True,
+        ),
+    ],
+    "llm_cache": [
+        pymongo.IndexModel(
+            [("expires_at", pymongo.ASCENDING)],
+            name="expires_at_ttl",
+            expireAfterSeconds=0,
+        ),
+    ],
+}
+
+dropped_indexes: typing.Dict[str, typing.List[str]] = {
+    "finances": ["user_date"],
+}
+
 
 def add_collection(name: str):
     if mongodb_database is None:
@@ -60,7 +138,13 @@ def init_database():
     global mongodb_client
     global mongodb_database
 
-    mongodb_client = AsyncIOMotorClient(DATABASE_HOST)
+    pool_settings = pool.load_pool_settings()
+
+    mongodb_client = AsyncIOMotorClient(
+        DATABASE_HOST,
+        event_listeners=[pool.pool_stats, metrics.command_metrics],
+        **pool_settings.to_client_options(),
+    )
     mongodb_database = mongodb_client.get_database(DATABASE_NAME)
 
     collections = [
@@ -73,3 +157,78 @@ def init_database():
         add_collection(collection)
 
     return mongodb_client, mongodb_database
+
+
+def supports_transactions() -> bool:
+    topology_description = getattr(mongodb_client, "topology_description", None)
+
+    return getattr(topology_description, "topology_type_name", None) in {
+        "ReplicaSetWithPrimary",
+        "Sharded",
+    }
+
+
+async def warm_pool(size: typing.Optional[int] = None) -> int:
+    if size is None:
+        size = pool.load_pool_settings().min_pool_size
+
+    if size <= 0:
+        return 0
+
+    await asyncio.gather(*(mongodb_database.command("ping") for _ in range(size)))
+
+    return size
+
+
+async def ensure_indexes():
+    for name, index_names in dropped_indexes.items():
+        collection = get_collection(name)
+        existing = await collection.index_information()
+
+        for index_name in index_names:
+            if index_name in existing:
+                await collection.drop_index(index_name)
+
+    for name, index_models in indexes.items():
+        await get_collection(name).create_indexes(index_models)
+
+
+async def get_index_report() -> typing.Dict[str, typing.Dict[str, typing.List[str]]]:
+    report = {}
+
+    for name, index_models in indexes.items():
+        collection = get_collection(name)
+
+        registered = [index_model.document["name"] for index_model in index_models]
+        existing = await collection.index_information()
+
+        accesses = {}
+        async for stats in collection.aggregate([{"$indexStats": {}}]):
+            accesses[stats["name"]] = stats["accesses"]["ops"]
+
+        report[name] = {
+            "missing": [index for index in registered if index not in existing],
+            "unused": [
+                index for index, ops in accesses.items() if index != "_id_" and ops == 0
+            ],
+            "unregistered": [
+                index
+                for index in existing
+                if index != "_id_" and index not in registered
+            ],
+        }
+
+    return report
+
+
+async def _print_index_report():
+    mongodb_client, _ = init_database()
+
+    try:
+        print(json.dumps(await get_index_report(), indent=2))
+    finally:
+        mongodb_client.close()
+
+
+if __name__ == "__main__":
+    asyncio.run(_print_index_report())
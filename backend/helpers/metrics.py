@@ -0,0 +1,182 @@
+import contextlib
+import threading
+import time
+import typing
+
+import fastapi
+import prometheus_client
+from helpers import cache
+from prometheus_client import core, registry
+from pymongo import monitoring
+
+COMMAND_COLLECTION_FIELDS = {"getMore": "collection"}
+IGNORED_COMMANDS = frozenset(
+    {"hello", "isMaster", "ismaster", "ping", "endSessions", "saslStart"}
+)
+
+http_request_duration = prometheus_client.Histogram(
+    "http_request_duration_seconds",
+    "HTTP request latency by route and status",
+    ["method", "route", "status"],
+)
+mongo_command_duration = prometheus_client.Histogram(
+    "mongo_command_duration_seconds",
+    "MongoDB command latency by collection and command",
+    ["collection", "command", "outcome"],
+    buckets=(0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5),
+)
+mongo_documents_returned = prometheus_client.Histogram(
+    "mongo_documents_returned",
+    "Documents returned or affected per MongoDB command",
+    ["collection", "command"],
+    buckets=(0, 1, 10, 100, 1000, 10000, 100000),
+)
+llm_calls = prometheus_client.Counter(
+    "llm_calls_total",
+    "LLM calls by purpose and outcome",
+    ["purpose", "outcome"],
+)
+llm_call_duration = prometheus_client.Histogram(
+    "llm_call_duration_seconds",
+    "LLM call latency by purpose",
+    ["purpose"],
+    buckets=(0.1, 0.25, 0.5, 1, 2.5, 5, 10, 20, 40, 60, 120),
+)
+currency_rate_fetches = prometheus_client.Counter(
+    "currency_rate_fetches_total",
+    "Upstream currency rate fetches by outcome",
+    ["outcome"],
+)
+
+
+async def timing_middleware(
+    request: fastapi.Request,
+    call_next: typing.Callable[[fastapi.Request], typing.Awaitable[fastapi.Response]],
+) -> fastapi.Response:
+    start = time.perf_counter()
+    status = 500
+
+    try:
+        response = await call_next(request)
+        status = response.status_code
+        return response
+    finally:
+        route = request.scope.get("route")
+        http_request_duration.labels(
+            method=request.method,
+            route=getattr(route, "path", "unmatched"),
+            status=str(status),
+        ).observe(time.perf_counter() - start)
+
+
+@contextlib.contextmanager
+def observe_llm_call(purpose: str) -> typing.Iterator[None]:
+    start = time.perf_counter()
+    outcome = "error"
+
+    try:
+        yield
+        outcome = "success"
+    finally:
+        llm_calls.labels(purpose=purpose, outcome=outcome).inc()
+        llm_call_duration.labels(purpose=purpose).observe(time.perf_counter() - start)
+
+
+def render() -> fastapi.Response:
+    return fastapi.Response(
+        prometheus_client.generate_latest(),
+        media_type=prometheus_client.CONTENT_TYPE_LATEST,
+    )
+
+
+class CommandMetricsListener(monitoring.CommandListener):
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.collections: typing.Dict[typing.Tuple[typing.Any, int], str] = {}
+
+    def started(self, event: monitoring.CommandStartedEvent):
+        if event.command_name in IGNORED_COMMANDS:
+            return
+
+        field = COMMAND_COLLECTION_FIELDS.get(event.command_name, event.command_name)
+        collection = event.command.get(field)
+        if not isinstance(collection, str):
+            collection = "none"
+
+        with self.lock:
+            self.collections[(event.connection_id, event.request_id)] = collection
+
+    def succeeded(self, event: monitoring.CommandSucceededEvent):
+        if (collection := self._pop_collection(event)) is None:
+            return
+
+        mongo_command_duration.labels(
+            collection=collection, command=event.command_name, outcome="success"
+        ).observe(event.duration_micros / 1_000_000)
+
+        if (documents := _count_documents(event.reply)) is not None:
+            mongo_documents_returned.labels(
+                collection=collection, command=event.command_name
+            ).observe(documents)
+
+    def failed(self, event: monitoring.CommandFailedEvent):
+        if (collection := self._pop_collection(event)) is None:
+            return
+
+        mongo_command_duration.labels(
+            collection=collection, command=event.command_name, outcome="failure"
+        ).observe(event.duration_micros / 1_000_000)
+
+    def _pop_collection(
+        self,
+        event: typing.Union[
+            monitoring.CommandSucceededEvent, monitoring.CommandFailedEvent
+        ],
+    ) -> typing.Optional[str]:
+        with self.lock:
+            return self.collections.pop((event.connection_id, event.request_id), None)
+
+
+class CacheCollector(registry.Collector):
+    def __init__(self):
+        self.caches: typing.Dict[str, cache.TTLCache] = {}
+
+    def collect(self) -> typing.Iterator[core.Metric]:
+        entries = core.GaugeMetricFamily(
+            "cache_entries", "Entries held per in-process cache", labels=["cache"]
+        )
+        hits = core.CounterMetricFamily(
+            "cache_hits", "Lookups served per in-process cache", labels=["cache"]
+        )
+        misses = core.CounterMetricFamily(
+            "cache_misses", "Lookups missed per in-process cache", labels=["cache"]
+        )
+
+        for name, ttl_cache in self.caches.items():
+            stats = ttl_cache.stats()
+            entries.add_metric([name], stats["size"])
+            hits.add_metric([name], stats["hits"])
+            misses.add_metric([name], stats["misses"])
+
+        yield entries
+        yield hits
+        yield misses
+
+
+def register_cache(name: str, ttl_cache: cache.TTLCache) -> None:
+    cache_collector.caches[name] = ttl_cache
+
+
+def _count_documents(reply: typing.Mapping[str, typing.Any]) -> typing.Optional[int]:
+    if (cursor := reply.get("cursor")) is not None:
+        return len(cursor.get("firstBatch", cursor.get("nextBatch", [])))
+
+    if "n" in reply:
+        return reply["n"]
+
+    return None
+
+
+command_metrics = CommandMetricsListener()
+cache_collector = CacheCollector()
+prometheus_client.REGISTRY.register(cache_collector)
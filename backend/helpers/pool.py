@@ -0,0 +1,160 @@
+import collections
+import importlib.util
+import os
+import threading
+import typing
+
+import numpy as np
+import pydantic
+from pymongo import monitoring
+
+COMPRESSOR_MODULES = {"zstd": "zstandard", "snappy": "snappy", "zlib": "zlib"}
+WAIT_TIME_SAMPLES = 2048
+
+
+class PoolSettings(pydantic.BaseModel):
+    max_pool_size: int = pydantic.Field(default=100, ge=1)
+    min_pool_size: int = pydantic.Field(default=0, ge=0)
+    max_idle_time_ms: typing.Optional[int] = pydantic.Field(default=None, ge=1)
+    wait_queue_timeout_ms: typing.Optional[int] = pydantic.Field(default=None, ge=1)
+    server_selection_timeout_ms: int = pydantic.Field(default=30000, ge=1)
+    connect_timeout_ms: int = pydantic.Field(default=20000, ge=1)
+    socket_timeout_ms: typing.Optional[int] = pydantic.Field(default=None, ge=1)
+    compressors: typing.List[typing.Literal["zstd", "snappy", "zlib"]] = []
+
+    @pydantic.field_validator("compressors")
+    @classmethod
+    def validate_compressors(cls, compressors: typing.List[str]) -> typing.List[str]:
+        for compressor in compressors:
+            if importlib.util.find_spec(COMPRESSOR_MODULES[compressor]) is None:
+                raise ValueError(
+                    f"Compressor {compressor} requires the "
+                    f"{COMPRESSOR_MODULES[compressor]} package"
+                )
+
+        return compressors
+
+    @pydantic.model_validator(mode="after")
+    def validate_pool_sizes(self) -> "PoolSettings":
+        if self.min_pool_size > self.max_pool_size:
+            raise ValueError("DATABASE_MIN_POOL_SIZE exceeds DATABASE_MAX_POOL_SIZE")
+
+        return self
+
+    def to_client_options(self) -> typing.Dict[str, typing.Any]:
+        options: typing.Dict[str, typing.Any] = {
+            "maxPoolSize": self.max_pool_size,
+            "minPoolSize": self.min_pool_size,
+            "maxIdleTimeMS": self.max_idle_time_ms,
+            "waitQueueTimeoutMS": self.wait_queue_timeout_ms,
+            "serverSelectionTimeoutMS": self.server_selection_timeout_ms,
+            "connectTimeoutMS": self.connect_timeout_ms,
+            "socketTimeoutMS": self.socket_timeout_ms,
+        }
+
+        if self.compressors:
+            options["compressors"] = ",".join(self.compressors)
+
+        return options
+
+
+def load_pool_settings() -> PoolSettings:
+    values: typing.Dict[str, typing.Any] = {}
+
+    for field in PoolSettings.model_fields:
+        if value := os.getenv(f"DATABASE_{field.upper()}"):
+            values[field] = value
+
+    if "compressors" in values:
+        values["compressors"] = [
+            compressor.strip()
+            for compressor in values["compressors"].split(",")
+            if compressor.strip()
+        ]
+
+    try:
+        return PoolSettings(**values)
+    except pydantic.ValidationError as e:
+        raise ValueError(f"Invalid database pool settings: {e}")
+
+
+class PoolStatsListener(monitoring.ConnectionPoolListener):
+    def __init__(self, samples: int = WAIT_TIME_SAMPLES):
+        self.lock = threading.Lock()
+        self.wait_times: typing.Deque[float] = collections.deque(maxlen=samples)
+        self.checkouts = 0
+        self.checkout_failures = 0
+        self.checked_out = 0
+        self.connections = 0
+        self.total_wait_time = 0.0
+        self.max_wait_time = 0.0
+
+    def connection_checked_out(self, event: monitoring.ConnectionCheckedOutEvent):
+        with self.lock:
+            self.wait_times.append(event.duration)
+            self.checkouts += 1
+            self.checked_out += 1
+            self.total_wait_time += event.duration
+            self.max_wait_time = max(self.max_wait_time, event.duration)
+
+    def connection_check_out_failed(
+        self, event: monitoring.ConnectionCheckOutFailedEvent
+    ):
+        with self.lock:
+            self.checkout_failures += 1
+            self.wait_times.append(event.duration)
+
+    def connection_checked_in(self, event: monitoring.ConnectionCheckedInEvent):
+        with self.lock:
+            self.checked_out -= 1
+
+    def connection_created(self, event: monitoring.ConnectionCreatedEvent):
+        with self.lock:
+            self.connections += 1
+
+    def connection_closed(self, event: monitoring.ConnectionClosedEvent):
+        with self.lock:
+            self.connections -= 1
+
+    def connection_check_out_started(self, event):
+        pass
+
+    def connection_ready(self, event):
+        pass
+
+    def pool_created(self, event):
+        pass
+
+    def pool_ready(self, event):
+        pass
+
+    def pool_cleared(self, event):
+        pass
+
+    def pool_closed(self, event):
+        pass
+
+    def stats(self) -> typing.Dict[str, typing.Any]:
+        with self.lock:
+            wait_times = np.array(self.wait_times, dtype=np.float64)
+            stats: typing.Dict[str, typing.Any] = {
+                "connections": self.connections,
+                "checked_out": self.checked_out,
+                "checkouts": self.checkouts,
+                "checkout_failures": self.checkout_failures,
+                "wait_time_total_seconds": self.total_wait_time,
+                "wait_time_max_seconds": self.max_wait_time,
+            }
+
+        if wait_times.size:
+            p50, p95, p99 = np.percentile(wait_times, [50, 95, 99])
+            stats.update(
+                wait_time_p50_seconds=float(p50),
+                wait_time_p95_seconds=float(p95),
+                wait_time_p99_seconds=float(p99),
+            )
+
+        return stats
+
+
+pool_stats = PoolStatsListener()
@@ -0,0 +1,23 @@
+import typing
+
+import bson
+import orjson
+from fastapi.responses import ORJSONResponse
+
+ORJSON_OPTIONS = orjson.OPT_UTC_Z | orjson.OPT_NON_STR_KEYS | orjson.OPT_SERIALIZE_NUMPY
+
+
+def _default(value: typing.Any) -> typing.Any:
+    if isinstance(value, bson.ObjectId):
+        return str(value)
+
+    raise TypeError(f"Type is not JSON serializable: {type(value).__name__}")
+
+
+def dumps(content: typing.Any) -> bytes:
+    return orjson.dumps(content, default=_default, option=ORJSON_OPTIONS)
+
+
+class LeanJSONResponse(ORJSONResponse):
+    def render(self, content: typing.Any) -> bytes:
+        return dumps(content)
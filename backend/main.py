@@ -1,12 +1,19 @@
+import asyncio
 import contextlib
 
 import dotenv
 import fastapi
+from admin.routes import router as admin_router
 from auth.routes import router as auth_router
 from calendarSummary.routes import router as calendar_router
 from fastapi.middleware.cors import CORSMiddleware
+from finances import functions as finances_functions
+from finances import rates as finances_rates
+from finances import rollups as finances_rollups
+from finances import slow_queries as finances_slow_queries
+from finances import subscription_occurrences as finances_subscription_occurrences
 from finances.routes import router as finances_router
-from helpers import database
+from helpers import database, metrics
 
 env_path = dotenv.find_dotenv(filename=".env", raise_error_if_not_found=True)
 if not env_path:
@@ -26,8 +33,28 @@ async def database_lifespan(app: fastapi.FastAPI):
     if not ping_response.get("ok"):
         raise Exception("Database connection failed")
 
+    await database.warm_pool()
+
+    await database.ensure_indexes()
+    await finances_slow_queries.ensure_collection()
+    await finances_rollups.ensure_backfilled()
+    await finances_rates.currency_rates.load()
+
+    currency_rates_refresher = asyncio.create_task(
+        finances_functions.run_currency_rates_refresher()
+    )
+
+    subscription_occurrences_extender = asyncio.create_task(
+        finances_subscription_occurrences.run_extender()
+    )
+
     yield
 
+    for task in [currency_rates_refresher, subscription_occurrences_extender]:
+        task.cancel()
+        with contextlib.suppress(asyncio.CancelledError):
+            await task
+
     mongodb_client.close()
 
 
@@ -35,6 +62,8 @@ app = fastapi.FastAPI(
     lifespan=database_lifespan,
 )
 
+app.middleware("http")(metrics.timing_middleware)
+
 app.add_middleware(
     CORSMiddleware,
     allow_origins=["*"],
@@ -47,7 +76,13 @@ routers = [
     auth_router,
     finances_router,
     calendar_router,
+    admin_router,
 ]
 
 for router in routers:
     app.include_router(router)
+
+
+@app.get("/metrics", include_in_schema=False)
+async def get_metrics():
+    return metrics.render()
@@ -0,0 +1,15 @@
+import pytest
+
+
+@pytest.fixture
+def mock_database(monkeypatch):
+    mongomock_motor = pytest.importorskip("mongomock_motor")
+
+    import helpers.database as database
+
+    client = mongomock_motor.AsyncMongoMockClient(tz_aware=True)
+    monkeypatch.setattr(database, "mongodb_client", client, raising=False)
+    monkeypatch.setattr(database, "mongodb_database", client["test"], raising=False)
+    monkeypatch.setattr(database, "collections", {})
+
+    return client["test"]
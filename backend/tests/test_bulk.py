@@ -0,0 +1,115 @@
+import asyncio
+
+import auth.functions as auth_functions
+import auth.models as auth_models
+import bson
+import fastapi
+import orjson
+import pytest
+from fastapi.testclient import TestClient
+from finances import models, routes
+
+ITEM = {
+    "name": "Coffee",
+    "amount": 3.5,
+    "date": "2025-01-10T08:00:00",
+    "category": "food",
+    "currency": "USD",
+}
+
+
+@pytest.fixture
+def user_id() -> bson.ObjectId:
+    return bson.ObjectId()
+
+
+@pytest.fixture
+def client(mock_database, user_id):
+    app = fastapi.FastAPI()
+    app.include_router(routes.router)
+    app.dependency_overrides[auth_functions.get_current_user] = lambda: (
+        auth_models.User(_id=user_id, username="user", password="")
+    )
+
+    return TestClient(app)
+
+
+def count_items(mock_database, query):
+    return asyncio.run(mock_database["finances"].count_documents(query))
+
+
+def test_bulk_reports_per_item_results(client, mock_database, user_id):
+    other_user = bson.ObjectId()
+
+    response = client.post(
+        "/finances/bulk/",
+        json=[
+            ITEM,
+            {**ITEM, "amount": "not a number"},
+            "not an object",
+            {**ITEM, "name": "Tea", "user": str(other_user), "is_subscription": True},
+        ],
+    )
+
+    assert response.status_code == 201
+    results = response.json()
+
+    assert [result["index"] for result in results] == [0, 1, 2, 3]
+    assert [result["error"] is None for result in results] == [True, False, False, True]
+    assert results[1]["error"].startswith("amount:")
+    assert results[2]["error"] == "Item must be an object"
+    assert results[1]["id"] is None and results[2]["id"] is None
+
+    assert count_items(mock_database, {"user": user_id}) == 2
+    assert count_items(mock_database, {"user": other_user}) == 0
+    assert count_items(mock_database, {"is_subscription": True}) == 0
+
+
+def test_bulk_accepts_ndjson(client, mock_database, user_id):
+    body = b"\n".join(orjson.dumps({**ITEM, "amount": index}) for index in range(3))
+
+    response = client.post(
+        "/finances/bulk/",
+        content=body + b"\n{broken\n",
+        headers={"content-type": "application/x-ndjson"},
+    )
+
+    assert response.status_code == 201
+    assert [result["error"] is None for result in response.json()] == [
+        True,
+        True,
+        True,
+        False,
+    ]
+    assert count_items(mock_database, {"user": user_id}) == 3
+
+
+def test_bulk_rejects_invalid_bodies(client, monkeypatch):
+    assert client.post("/finances/bulk/", json=ITEM).status_code == 400
+    assert (
+        client.post(
+            "/finances/bulk/",
+            content=b"[",
+            headers={"content-type": "application/json"},
+        ).status_code
+        == 400
+    )
+
+    monkeypatch.setattr(routes, "BULK_MAX_ITEMS", 2)
+    assert client.post("/finances/bulk/", json=[ITEM] * 3).status_code == 413
+
+
+def test_create_items_inserts_across_batches(mock_database, user_id):
+    wrapper = models.FinanceItemWrapper("UTC")
+    items = [
+        models.FinanceItem(
+            **{**ITEM, "amount": index}, user=user_id, is_subscription=False
+        )
+        for index in range(5)
+    ]
+
+    results = asyncio.run(wrapper.create_items(items, batch_size=2))
+
+    assert [error for _, error in results] == [None] * 5
+    assert [item_id for item_id, _ in results] == [item.id for item in items]
+    assert count_items(mock_database, {"user": user_id}) == 5
@@ -0,0 +1,109 @@
+import datetime
+
+import pytz
+
+from finances import occurrences
+
+
+def get_occurrences(start_date, repeat_period, repeat_value, window_end, **kwargs):
+    return list(
+        occurrences.iter_occurrences(
+            start_date,
+            repeat_period,
+            repeat_value,
+            window_start=kwargs.pop("window_start", start_date),
+            window_end=window_end,
+            **kwargs,
+        )
+    )
+
+
+def test_monthly_occurrences_clamp_to_month_end():
+    dates = get_occurrences(
+        datetime.datetime(2024, 1, 31), "month", 1, datetime.datetime(2024, 5, 31)
+    )
+
+    assert [date.date() for date in dates] == [
+        datetime.date(2024, 1, 31),
+        datetime.date(2024, 2, 29),
+        datetime.date(2024, 3, 31),
+        datetime.date(2024, 4, 30),
+        datetime.date(2024, 5, 31),
+    ]
+
+
+def test_yearly_occurrences_clamp_leap_day():
+    dates = get_occurrences(
+        datetime.datetime(2024, 2, 29), "year", 1, datetime.datetime(2028, 12, 31)
+    )
+
+    assert [date.date() for date in dates] == [
+        datetime.date(2024, 2, 29),
+        datetime.date(2025, 2, 28),
+        datetime.date(2026, 2, 28),
+        datetime.date(2027, 2, 28),
+        datetime.date(2028, 2, 29),
+    ]
+
+
+def test_daily_occurrences_keep_wall_time_across_dst():
+    warsaw = pytz.timezone("Europe/Warsaw")
+
+    dates = get_occurrences(
+        warsaw.localize(datetime.datetime(2024, 3, 30, 12)),
+        "day",
+        1,
+        warsaw.localize(datetime.datetime(2024, 4, 1, 12)),
+        timezone="Europe/Warsaw",
+    )
+
+    assert [date.hour for date in dates] == [12, 12, 12]
+    assert [date.utcoffset() for date in dates] == [
+        datetime.timedelta(hours=1),
+        datetime.timedelta(hours=2),
+        datetime.timedelta(hours=2),
+    ]
+
+
+def test_occurrences_respect_window_start_and_end_date():
+    dates = get_occurrences(
+        datetime.datetime(2024, 1, 1),
+        "week",
+        2,
+        datetime.datetime(2024, 12, 31),
+        window_start=datetime.datetime(2024, 2, 1),
+        end_date=datetime.datetime(2024, 3, 11),
+    )
+
+    assert [date.date() for date in dates] == [
+        datetime.date(2024, 2, 12),
+        datetime.date(2024, 2, 26),
+        datetime.date(2024, 3, 11),
+    ]
+
+
+def test_zero_repeat_value_yields_start_date_once():
+    start_date = datetime.datetime(2024, 1, 15)
+
+    assert get_occurrences(start_date, "month", 0, datetime.datetime(2024, 12, 31)) == [
+        pytz.utc.localize(start_date)
+    ]
+    assert (
+        get_occurrences(
+            start_date,
+            "month",
+            0,
+            datetime.datetime(2024, 12, 31),
+            window_start=datetime.datetime(2024, 2, 1),
+        )
+        == []
+    )
+
+
+def test_batches_do_not_change_occurrences():
+    arguments = (datetime.datetime(2020, 1, 31), "month", 1)
+    window_end = datetime.datetime(2024, 12, 31)
+
+    assert get_occurrences(*arguments, window_end, batch_size=7) == get_occurrences(
+        *arguments, window_end
+    )
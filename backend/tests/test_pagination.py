@@ -0,0 +1,98 @@
+import asyncio
+import datetime
+
+import bson
+import pytest
+
+from finances import models
+
+PAGE_SIZE = 3
+
+
+@pytest.fixture
+def wrapper(mock_database):
+    return models.FinanceItemWrapper("UTC")
+
+
+def create_item(user_id: bson.ObjectId, name: str, date: datetime.datetime):
+    return models.FinanceItem(
+        name=name,
+        amount=1,
+        date=date,
+        category="food",
+        user=user_id,
+        currency="USD",
+        is_subscription=False,
+    )
+
+
+async def seed(wrapper: models.FinanceItemWrapper, user_id: bson.ObjectId):
+    for day in [1, 2, 2, 2, 4, 6, 6]:
+        await wrapper.create_item(
+            create_item(user_id, f"item {day}", datetime.datetime(2025, 1, day))
+        )
+
+    await wrapper.create_subscription_item(
+        create_item(user_id, "subscription", datetime.datetime(2025, 1, 2)), "day", "2"
+    )
+
+
+async def list_page(wrapper, user_id, after=None):
+    page = []
+
+    async for item in wrapper.list_items("2025-01-01", "2025-01-07", user_id, after):
+        if len(page) == PAGE_SIZE:
+            break
+
+        page.append(item)
+
+    return page
+
+
+def get_key(item: models.FinanceItem):
+    return item.date, str(item.id), item.name
+
+
+def test_keyset_pages_cover_every_item_once(wrapper):
+    user_id = bson.ObjectId()
+
+    async def scenario():
+        await seed(wrapper, user_id)
+
+        expected = [
+            get_key(item)
+            async for item in wrapper.list_items("2025-01-01", "2025-01-07", user_id)
+        ]
+
+        paged = []
+        after = None
+        for _ in range(len(expected)):
+            if not (page := await list_page(wrapper, user_id, after)):
+                break
+
+            paged.extend(get_key(item) for item in page)
+            after = (page[-1].date, page[-1].id)
+
+        return expected, paged
+
+    expected, paged = asyncio.run(scenario())
+
+    assert len(expected) == 10
+    assert paged == expected
+    assert expected == sorted(expected, key=lambda key: key[:2])
+
+
+def test_after_skips_items_up_to_the_cursor(wrapper):
+    user_id = bson.ObjectId()
+
+    async def scenario():
+        await seed(wrapper, user_id)
+
+        items = await list_page(wrapper, user_id)
+        cursor = items[-1]
+
+        return cursor, await list_page(wrapper, user_id, (cursor.date, cursor.id))
+
+    cursor, page = asyncio.run(scenario())
+
+    assert all(get_key(item)[:2] > get_key(cursor)[:2] for item in page)
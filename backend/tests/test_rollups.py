@@ -0,0 +1,140 @@
+import asyncio
+import datetime
+
+import bson
+import pytest
+from finances import models, rollups
+
+
+@pytest.fixture
+def wrapper(mock_database):
+    return models.FinanceItemWrapper("UTC")
+
+
+def create_item(user_id, amount, date, category="food", currency="USD"):
+    return models.FinanceItem(
+        name="item",
+        amount=amount,
+        date=date,
+        category=category,
+        user=user_id,
+        currency=currency,
+        is_subscription=False,
+    )
+
+
+async def rebuild(mock_database):
+    expected = {}
+
+    async for doc in mock_database["finances"].find({}):
+        totals = expected.setdefault(rollups.get_rollup_key(doc), [0, 0])
+        totals[0] += rollups.to_cents(doc["amount"])
+        totals[1] += 1
+
+    return expected
+
+
+async def load_rollups(mock_database):
+    return {
+        (doc["user"], doc["day"], doc["currency"], doc["category"]): [
+            doc["amount_cents"],
+            doc["count"],
+        ]
+        async for doc in mock_database["rollups"].find({})
+    }
+
+
+def test_incremental_rollups_match_rebuild(wrapper, mock_database):
+    user_id = bson.ObjectId()
+
+    async def scenario():
+        first = await wrapper.create_item(
+            create_item(user_id, 0.1, datetime.datetime(2025, 1, 1, 10))
+        )
+        await wrapper.create_item(
+            create_item(user_id, 0.2, datetime.datetime(2025, 1, 1, 18))
+        )
+        second = await wrapper.create_item(
+            create_item(user_id, 5, datetime.datetime(2025, 1, 2), currency="EUR")
+        )
+        await wrapper.create_items(
+            [
+                create_item(user_id, 1.005, datetime.datetime(2025, 1, 3)),
+                create_item(user_id, 2, datetime.datetime(2025, 1, 3), "payment"),
+            ]
+        )
+
+        await wrapper.update_item(
+            first.id,
+            user_id,
+            create_item(user_id, 7.25, datetime.datetime(2025, 1, 3), "payment"),
+        )
+        await wrapper.delete_item(second.id, user_id=user_id)
+
+        return await load_rollups(mock_database), await rebuild(mock_database)
+
+    actual, expected = asyncio.run(scenario())
+
+    assert actual == expected
+    assert all(count > 0 for _, count in actual.values())
+    assert (user_id, "2025-01-02", "EUR", "food") not in actual
+
+
+def test_apply_changes_cancels_out(mock_database):
+    doc = {
+        "user": bson.ObjectId(),
+        "date": datetime.datetime(2025, 1, 1),
+        "currency": "USD",
+        "category": "food",
+        "amount": 12.34,
+    }
+
+    async def scenario():
+        await rollups.apply_changes(added=[doc, doc])
+        after_add = await load_rollups(mock_database)
+        await rollups.apply_changes(removed=[doc, doc])
+
+        return after_add, await load_rollups(mock_database)
+
+    after_add, after_remove = asyncio.run(scenario())
+
+    assert list(after_add.values()) == [[2468, 2]]
+    assert after_remove == {}
+
+
+def test_summarize_returns_amounts_per_day_and_currency(mock_database):
+    user_id = bson.ObjectId()
+    docs = [
+        {
+            "user": user_id,
+            "date": datetime.datetime(2025, 1, day),
+            "currency": currency,
+            "category": category,
+            "amount": amount,
+        }
+        for day, currency, category, amount in [
+            (1, "USD", "food", 1.5),
+            (1, "USD", "payment", 2.25),
+            (1, "EUR", "food", 3),
+            (2, "USD", "food", 4),
+            (9, "USD", "food", 100),
+        ]
+    ]
+
+    async def scenario():
+        await rollups.apply_changes(added=docs)
+
+        return await rollups.summarize(user_id, "2025-01-01", "2025-01-02")
+
+    assert asyncio.run(scenario()) == {
+        "2025-01-01": {"USD": 3.75, "EUR": 3.0},
+        "2025-01-02": {"USD": 4.0},
+    }
+
+
+def test_rollup_day_uses_rollup_timezone(monkeypatch):
+    monkeypatch.setattr(rollups, "ROLLUP_TIMEZONE", "Europe/Warsaw")
+
+    assert rollups.get_rollup_day(datetime.datetime(2024, 12, 31, 23, 30)) == (
+        "2025-01-01"
+    )
@@ -0,0 +1,49 @@
+import asyncio
+import datetime
+
+import bson
+import pytest
+
+mongomock_motor = pytest.importorskip("mongomock_motor")
+
+import helpers.database as database  # noqa: E402
+from finances import models  # noqa: E402
+
+
+@pytest.fixture
+def wrapper(monkeypatch):
+    client = mongomock_motor.AsyncMongoMockClient(tz_aware=True)
+    monkeypatch.setattr(database, "mongodb_client", client, raising=False)
+    monkeypatch.setattr(database, "mongodb_database", client["test"], raising=False)
+    monkeypatch.setattr(database, "collections", {})
+
+    return models.FinanceItemWrapper("UTC")
+
+
+def test_pause_then_later_pause_restores_occurrences(wrapper):
+    user_id = bson.ObjectId()
+
+    async def scenario():
+        subscription = await wrapper.create_subscription_item(
+            models.FinanceItem(
+                name="Gym",
+                amount=10,
+                date=datetime.datetime(2025, 1, 1),
+                category="payment",
+                user=user_id,
+                currency="USD",
+                is_subscription=False,
+            ),
+            "day",
+            "2",
+        )
+
+        await wrapper.pause_subscription_item(subscription.id, user_id, "2025-01-05")
+        await wrapper.pause_subscription_item(subscription.id, user_id, "2025-01-09")
+
+        return [
+            item.date.day
+            async for item in wrapper.list_items("2025-01-01", "2025-01-31", user_id)
+        ]
+
+    assert asyncio.run(scenario()) == [1, 3, 5, 7, 9]
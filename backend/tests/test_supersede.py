@@ -0,0 +1,135 @@
+import asyncio
+import datetime
+
+import bson
+import pymongo.errors
+import pytest
+from finances import models
+
+
+@pytest.fixture
+def wrapper(mock_database):
+    return models.FinanceItemWrapper("UTC")
+
+
+@pytest.fixture
+def user_id() -> bson.ObjectId:
+    return bson.ObjectId()
+
+
+async def create_subscription(wrapper, user_id):
+    return await wrapper.create_subscription_item(
+        models.FinanceItem(
+            name="Gym",
+            amount=10,
+            date=datetime.datetime(2025, 1, 1),
+            category="payment",
+            user=user_id,
+            currency="USD",
+            is_subscription=False,
+        ),
+        "month",
+        "1",
+    )
+
+
+def get_update(user_id, subscription_id, amount=20):
+    return models.SubscriptionItem(
+        _id=subscription_id,
+        name="Gym",
+        amount=amount,
+        date=datetime.datetime(2025, 4, 1),
+        start_date=datetime.datetime(2025, 4, 1),
+        category="payment",
+        user=user_id,
+        currency="USD",
+        is_subscription=True,
+        repeat_period="month",
+        repeat_value=1,
+    )
+
+
+def count_subscriptions(wrapper):
+    return asyncio.run(wrapper.subscriptions_collection.count_documents({}))
+
+
+def test_update_supersedes_previous_version(wrapper, user_id):
+    async def scenario():
+        subscription = await create_subscription(wrapper, user_id)
+        successor = await wrapper.update_subscription_item(
+            subscription.id,
+            user_id,
+            get_update(user_id, subscription.id),
+            expected_version=0,
+        )
+        previous = await wrapper.subscriptions_collection.find_one(
+            {"_id": subscription.id}
+        )
+        items = [
+            (item.date.month, item.amount)
+            async for item in wrapper.list_items("2025-01-01", "2025-06-30", user_id)
+        ]
+
+        return subscription, successor, previous, items
+
+    subscription, successor, previous, items = asyncio.run(scenario())
+
+    assert successor.supersedes == subscription.id
+    assert previous["superseded_by"] == successor.id
+    assert previous["version"] == 1
+    assert previous["end_date"].date() == datetime.date(2025, 3, 31)
+    assert items == [(1, 10), (2, 10), (3, 10), (4, 20), (5, 20), (6, 20)]
+
+
+def test_stale_version_conflicts_without_orphans(wrapper, user_id):
+    subscription = asyncio.run(create_subscription(wrapper, user_id))
+
+    with pytest.raises(models.VersionConflictError):
+        asyncio.run(
+            wrapper.update_subscription_item(
+                subscription.id,
+                user_id,
+                get_update(user_id, subscription.id),
+                expected_version=3,
+            )
+        )
+
+    assert count_subscriptions(wrapper) == 1
+
+
+def test_superseded_version_cannot_be_updated_or_paused(wrapper, user_id):
+    async def scenario():
+        subscription = await create_subscription(wrapper, user_id)
+        await wrapper.update_subscription_item(
+            subscription.id, user_id, get_update(user_id, subscription.id)
+        )
+
+        return (
+            await wrapper.update_subscription_item(
+                subscription.id, user_id, get_update(user_id, subscription.id, 30)
+            ),
+            await wrapper.pause_subscription_item(
+                subscription.id, user_id, "2025-12-01"
+            ),
+        )
+
+    assert asyncio.run(scenario()) == (None, None)
+    assert count_subscriptions(wrapper) == 2
+
+
+def test_failed_close_removes_inserted_successor(wrapper, user_id, monkeypatch):
+    subscription = asyncio.run(create_subscription(wrapper, user_id))
+
+    async def fail_update_one(*args, **kwargs):
+        raise pymongo.errors.AutoReconnect("connection lost")
+
+    monkeypatch.setattr(wrapper.subscriptions_collection, "update_one", fail_update_one)
+
+    with pytest.raises(pymongo.errors.AutoReconnect):
+        asyncio.run(
+            wrapper.update_subscription_item(
+                subscription.id, user_id, get_update(user_id, subscription.id)
+            )
+        )
+
+    assert count_subscriptions(wrapper) == 1
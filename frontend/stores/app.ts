@@ -53,6 +53,24 @@ export const useAppStore = defineStore('app', () => {
     loading.value = false
   }
 
+  const addFinanceItems = async (items: IFinanceItem[]) => {
+    loading.value = true
+
+    const url = '/finances/bulk/'
+    const response = await apiStore.sendRequest({ url, method: 'POST', data: items })
+
+    if (apiStore.isResponseOk(response)) {
+      const responseObject = response as AxiosResponse
+      const createdItems = responseObject.data
+        .filter((result: any) => result.id)
+        .map((result: any) => ({ ...items[result.index], id: result.id }))
+
+      financeItems.value.push(...createdItems)
+    }
+
+    loading.value = false
+  }
+
   const updateFinanceItem = async (item: IFinanceItem) => {
     loading.value = true
 
@@ -175,6 +193,7 @@ export const useAppStore = defineStore('app', () => {
     currencyRates,
     fetchFinanceItems,
     addFinanceItem,
+    addFinanceItems,
     updateFinanceItem,
     deleteFinanceItem,
     getCalendarSummary,